@@ -1,37 +1,47 @@
 from __future__ import annotations
 
-import subprocess
+import argparse
+import json
+import math
+import os
+import queue
+import re
+import sys
+import threading
 import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from enum import Enum
+from fractions import Fraction
+from itertools import repeat
 from pathlib import Path
-from typing import NamedTuple
+from typing import Callable, Iterable, Iterator, NamedTuple, Sequence, TypeVar
 
 import ttkbootstrap as ttkb
-from PIL import ImageFont
-from attrs import define
+from PIL import Image
+from attrs import NOTHING, asdict, define, fields
 from loguru import logger
 from stlrcore.audio_utils import audio_only, is_audio_only
 from stlrcore.transcribe import Segment, Transcription, WordTiming
 
-from src.image import get_system_fonts, render_text, transparent_image
-from src.ui import CCombobox, CEntry, CSwitch, CText, CToplevel, TextAlignment, file_selection_row, CTextLogHandler
+from src.image import (LineBreaking, SpriteCache, cache_key, get_system_fonts, image_digest, iter_system_fonts,
+                       load_font, render_text, renderer_version, transparent_image)
+from src.jobs import JobControl
+from src.subtitles import AssStyle, Cue, read_srt, write_ass, write_vtt
+from src.timeline import Run, as_fraction, changed_ranges, clip_runs, frame_to_time, schedule, split_at_gaps
+from src.ui import (CCombobox, CEntry, CSwitch, CText, CToplevel, JobRunner, TextAlignment, file_selection_row,
+                    CTextLogHandler)
+from src.utils import bounded_map, link_or_copy, work_directory
+from src.video import (BurnInEncoder, Chunk, Encoder, MediaInfo, burn_in, concat_videos, encode_in_chunks,
+                       encode_parts, frames_to_video, images_to_video, probe_media, write_concat_script)
 
 GRID_KW = dict(sticky="nsew", padx=10, pady=10)
+DEFAULT_CANVAS_SIZE = (1920, 1080)
+DEFAULT_FPS = Fraction(30)
+MEDIA_SUFFIXES = {".mp4", ".mkv", ".mov", ".webm", ".avi", ".m4v", ".mp3", ".wav", ".flac", ".m4a", ".ogg", ".opus"}
+JOB_MANIFEST = "job.json"
+CHUNK_MANIFEST = "chunks.json"
 
-
-def images_to_video(image_template: str, fps: float) -> Path:
-    """
-    Convert a sequence of images to a video file.
-    https://video.stackexchange.com/a/33011
-    ffmpeg -i anim.%04d.png -r 30 -pix_fmt yuva420p video.webm
-
-    >>> images_to_video("anim.%04d.png")
-    ...
-    """
-    dest = Path("output.webm")
-    command = ("ffmpeg", "-i", image_template, "-r", str(fps), "-pix_fmt", "yuva420p", str(dest))
-    subprocess.run(command, capture_output=True)
-
-    return dest
+E = TypeVar("E", bound=Enum)
 
 
 def clear_directory(directory: Path, *, glob: str = "*") -> None:
@@ -47,12 +57,29 @@ def clear_directory(directory: Path, *, glob: str = "*") -> None:
             f.rmdir()
 
 
+class OutputMode(Enum):
+    FRAMES = "frames"  # one PNG per video frame, in the job directory
+    STREAM = "stream"  # raw frames piped straight into ffmpeg
+    CONCAT = "concat"  # one PNG per distinct image, timed by an ffmpeg concat script
+    VFR = "vfr"  # as CONCAT, but encoded at a variable frame rate, so only changes are stored
+    ASS = "ass"  # no rendering at all: a styled subtitle script for the player/ffmpeg to render
+    BURN_IN = "burn-in"  # sprites composited straight onto the source video
+
+
 class BoundingBox(NamedTuple):
     x: int
     y: int
     width: int
     height: int
 
+    @property
+    def position(self) -> tuple[int, int]:
+        return self.x, self.y
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
 
 @define
 class SubtitleConfig:
@@ -63,25 +90,267 @@ class SubtitleConfig:
     end_time: float
     ligatures: bool
     alignment: TextAlignment
-    fps: float
+    fps: Fraction
+    output_mode: OutputMode = OutputMode.FRAMES
+    canvas_size: tuple[int, int] = DEFAULT_CANVAS_SIZE
+    duration: float | None = None
+    workers: int = 1
+    line_breaking: LineBreaking = LineBreaking.GREEDY
+    auto_fit: bool = False
+    render_cache: bool = True
+    keep_chunks: bool = True
+    source: Path | None = None
+    encoder: Encoder = Encoder.VP9_GOOD
+    burn_in_encoder: BurnInEncoder = BurnInEncoder.H264
+
+
+def config_to_dict(config: SubtitleConfig) -> dict:
+    """Convert the configuration to plain (JSON/TOML-friendly) values."""
+    data = asdict(config, recurse=False)
+    data.update(
+        bounding_box=list(config.bounding_box),
+        font=str(config.font),
+        alignment=config.alignment.name,
+        fps=str(config.fps),
+        output_mode=config.output_mode.name,
+        canvas_size=list(config.canvas_size),
+        line_breaking=config.line_breaking.name,
+        source=str(config.source) if config.source is not None else None,
+        encoder=config.encoder.name,
+        burn_in_encoder=config.burn_in_encoder.name
+    )
+
+    return data
+
+
+def enum_member(enum: type[E], name: str, setting: str) -> E:
+    """Look up an enum member by name, with a readable error naming the setting if there's no such member."""
+    try:
+        return enum[name]
+    except KeyError:
+        raise ValueError(f"{setting} must be one of {', '.join(enum.__members__)}, not {name!r}") from None
+
+
+def config_from_dict(data: dict) -> SubtitleConfig:
+    """Inverse of config_to_dict. Any optional fields which are missing take their defaults.
+
+    Raises ValueError for unknown or missing settings and for invalid values.
+    """
+    settings = {field.name: field for field in fields(SubtitleConfig)}
+    if unknown := sorted(set(data) - set(settings)):
+        raise ValueError(f"unknown settings: {', '.join(unknown)}")
+
+    if missing := [name for name, field in settings.items() if field.default is NOTHING and name not in data]:
+        raise ValueError(f"missing settings: {', '.join(missing)}")
+
+    data = dict(data)
+    data.update(
+        bounding_box=BoundingBox(*data["bounding_box"]),
+        font=Path(data["font"]),
+        alignment=enum_member(TextAlignment, data["alignment"], "alignment"),
+        fps=as_fraction(data["fps"])
+    )
+
+    if data.get("source") is not None:
+        data["source"] = Path(data["source"])
+
+    if "output_mode" in data:
+        data["output_mode"] = enum_member(OutputMode, data["output_mode"], "output_mode")
+
+    if "canvas_size" in data:
+        data["canvas_size"] = tuple(data["canvas_size"])
+
+    if "line_breaking" in data:
+        data["line_breaking"] = enum_member(LineBreaking, data["line_breaking"], "line_breaking")
+
+    if "encoder" in data:
+        data["encoder"] = enum_member(Encoder, data["encoder"], "encoder")
+
+    if "burn_in_encoder" in data:
+        data["burn_in_encoder"] = enum_member(BurnInEncoder, data["burn_in_encoder"], "burn_in_encoder")
+
+    return SubtitleConfig(**data)
+
+
+def output_path(source: Path | None, suffix: str) -> Path:
+    """Where to write a job's finished output: beside the source media, so that each job's output is kept apart.
+
+    With no suffix, this is the job directory, which holds the job's manifest (and its frames, for frame output).
+    """
+    if source is None:
+        return Path("output").with_suffix(suffix)
+
+    return source.with_name(f"{source.stem}-subtitles{suffix}")
+
+
+def encoder_threads(processes: int = 1) -> int:
+    """Share the CPUs between the given number of concurrent ffmpeg processes."""
+    return max((os.cpu_count() or 1) // max(processes, 1), 1)
+
+
+def segments_from_cues(cues: list[Cue]) -> list[Segment]:
+    """Build one segment per subtitle cue (in the same form that user_correct_transcription produces)."""
+    return [Segment(words=[WordTiming(word=cue.text, start=cue.start, end=cue.end)], wait_after=0.0) for cue in cues]
+
+
+def iter_cues(segments: Iterable[Segment]) -> Iterator[Cue]:
+    for segment in segments:
+        yield Cue(segment.start, segment.end, str(segment))
+
+
+def vtt_settings(config: SubtitleConfig) -> str:
+    """Express the bounding box and alignment as WebVTT cue settings (as percentages of the canvas)."""
+    box = config.bounding_box
+    canvas_width, canvas_height = config.canvas_size
+
+    # the cue box's "position" is its left edge, centre, or right edge, depending on its alignment
+    align, x = {
+        TextAlignment.LEFT: ("start", box.x),
+        TextAlignment.CENTRE: ("center", box.x + box.width / 2),
+        TextAlignment.RIGHT: ("end", box.x + box.width),
+    }[config.alignment]
+
+    return (f"align:{align} position:{100 * x / canvas_width:.2f}% size:{100 * box.width / canvas_width:.2f}% "
+            f"line:{100 * box.y / canvas_height:.2f}%")
+
+
+def ass_style(config: SubtitleConfig) -> AssStyle:
+    """Express the subtitle configuration as an ASS style: the bounding box becomes margins, top-aligned within it.
+
+    PIL sizes fonts by their em square, but libass sizes them by their full height (ascent + descent), so the ASS size
+    is that height at the configured size, to make the text come out as large as in the rendered sprites.
+    """
+    font = load_font(config.font, size=config.fontsize)
+    family, weight = font.getname()
+    ascent, descent = font.getmetrics()
+    box = config.bounding_box
+    alignment = {TextAlignment.LEFT: 7, TextAlignment.CENTRE: 8, TextAlignment.RIGHT: 9}[config.alignment]
+
+    return AssStyle(
+        fontname=family,
+        fontsize=ascent + descent,
+        alignment=alignment,
+        margin_l=box.x,
+        margin_r=max(config.canvas_size[0] - (box.x + box.width), 0),
+        margin_v=box.y,
+        bold="Bold" in (weight or ""),
+        italic="Italic" in (weight or "") or "Oblique" in (weight or "")
+    )
+
+
+def save_job(job_dir: Path, segments: list[Segment], config: SubtitleConfig) -> Path:
+    """Record what was rendered into job_dir, so it can later be re-rendered incrementally."""
+    manifest = {
+        "config": config_to_dict(config),
+        "segments": [[segment.start, segment.end, str(segment)] for segment in segments]
+    }
+
+    job_dir.mkdir(exist_ok=True)
+    dest = job_dir / JOB_MANIFEST
+    dest.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    return dest
+
+
+def load_job(job_dir: Path) -> tuple[list[Segment], SubtitleConfig]:
+    """Read back the segments and configuration recorded by save_job."""
+    manifest = json.loads((job_dir / JOB_MANIFEST).read_text(encoding="utf-8"))
+    cues = [Cue(*segment) for segment in manifest["segments"]]
+
+    return segments_from_cues(cues), config_from_dict(manifest["config"])
+
+
+class FontCatalogue:
+    """The system fonts, discovered in a background thread and handed to the Tk main thread as they are found."""
+
+    def __init__(self, master: ttkb.Window, *, poll_interval: int = 100) -> None:
+        self.master = master
+        self.poll_interval = poll_interval
+        self.fonts: dict[str, Path] = {}
+        self.finished = False
+
+        self._found: queue.SimpleQueue[tuple[str, Path] | None] = queue.SimpleQueue()
+        self._callbacks: list[Callable[[], None]] = []
+
+        threading.Thread(target=self._discover, daemon=True).start()
+        self.master.after(self.poll_interval, self._poll)
+
+    def subscribe(self, callback: Callable[[], None]) -> None:
+        """Call the given function (on the main thread) whenever more fonts are found."""
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: Callable[[], None]) -> None:
+        self._callbacks.remove(callback)
+
+    def _discover(self) -> None:
+        try:
+            for name, path in iter_system_fonts():
+                self._found.put((name, path))
+        finally:
+            self._found.put(None)
+
+    def _poll(self) -> None:
+        updated = False
+
+        while True:
+            try:
+                item = self._found.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                self.finished = True
+                logger.debug(f"{len(self.fonts)} fonts found")
+                break
+
+            name, path = item
+            self.fonts[name] = path
+            updated = True
+
+        if updated:
+            for callback in list(self._callbacks):
+                callback()
+
+        if not self.finished:
+            self.master.after(self.poll_interval, self._poll)
 
 
 class Selene(ttkb.Window):
-    def __init__(self, title, *args, **kwargs):
+    def __init__(self, title, *args, work_root: Path | None = None, **kwargs):
         super().__init__(title, *args, **kwargs)
+        self.work_root = work_root
+
+        # start looking for fonts now, so they're ready by the time we need them
+        self.fonts = FontCatalogue(self)
 
         self.media_file_box, self.media_file_button = file_selection_row(self, row=0, label_text="Media File",
                                                                          grid_kw=GRID_KW)
 
         self.progress = ttkb.Floodgauge(bootstyle=ttkb.INFO, mode="indeterminate")
 
-        button = ttkb.Button(self, text="Transcribe", command=lambda: run(media_file=Path(self.media_file_box.text),
-                                                                          progress_meter=self.progress))
-        button.grid(row=1, column=0, columnspan=3, **GRID_KW)  # type: ignore
+        # the pipeline runs on a worker thread, so the window stays responsive (and the job can be cancelled)
+        self.jobs = JobRunner(self)
+        self.jobs.job.listeners.append(lambda stage, fraction: self.jobs.post(self.show_progress, stage, fraction))
+
+        button = ttkb.Button(self, text="Transcribe",
+                             command=lambda: self.jobs.start(run, media_file=Path(self.media_file_box.text),
+                                                             progress_meter=self.progress, fonts=self.fonts,
+                                                             runner=self.jobs, work_root=self.work_root))
+        button.grid(row=1, column=0, columnspan=2, **GRID_KW)  # type: ignore
+
+        cancel_button = ttkb.Button(self, text="Cancel", command=self.jobs.cancel, bootstyle="secondary")
+        cancel_button.grid(row=1, column=2, **GRID_KW)  # type: ignore
 
         # add progress bar
         self.progress.grid(row=2, column=0, columnspan=3, **GRID_KW)  # type: ignore
 
+        # re-render a previous job from a corrected SRT
+        self.srt_file_box, self.srt_file_button = file_selection_row(self, row=3, label_text="Edited SRT",
+                                                                     grid_kw=GRID_KW)
+        rerender_button = ttkb.Button(self, text="Re-render from SRT",
+                                      command=lambda: self.rerender(Path(self.srt_file_box.text)))
+        rerender_button.grid(row=4, column=0, columnspan=3, **GRID_KW)  # type: ignore
+
         # add log container
         log_box = CText(self)
         log_box.configure(state="disabled", font="TkFixedFont")
@@ -91,38 +360,52 @@ class Selene(ttkb.Window):
         fmt = '<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <level>{message}</level>'
         logger.add(handler, format=fmt)
 
+    def rerender(self, srt: Path) -> None:
+        """Re-render the job for the media file that the (edited) SRT file was written for."""
+        self.jobs.start(rerender_from_srt, job_dir=output_path(srt, ""), srt=srt, job=self.jobs.job,
+                        work_root=self.work_root)
+
+    def show_progress(self, stage: str, fraction: float) -> None:
+        """Show how far through the given stage the current job is."""
+        self.progress.configure(mode="determinate", value=100 * fraction, text=f"{stage} {fraction:.0%}")
+
+
+def run(media_file: Path, progress_meter: ttkb.Floodgauge, fonts: FontCatalogue, runner: JobRunner,
+        work_root: Path | None = None) -> None:
+    """Run the whole pipeline. This runs on the runner's worker thread, so anything touching Tk goes via in_main."""
+    in_main = runner.call_in_main
+    job = runner.job
 
-def run(media_file: Path, progress_meter: ttkb.Floodgauge) -> None:
     # Step 0: Load file
     try:
-        a = is_audio_only(media_file)
+        audio_file = load_audio(media_file)
     except ValueError:
         logger.error(f"{media_file} is not a valid media file.")
         return
 
-    if a:
-        audio_file = media_file
-        logger.debug(f"{audio_file} is already an audio file")
-    else:
-        logger.info(f"{media_file} is not an audio file. Converting...")
-        audio_file = audio_only(media_file)
-        logger.success(f"Conversion successful: {audio_file}")
+    media = probe_media(media_file)
+    logger.debug(f"{media_file}: {media}")
+    job.checkpoint()
 
     # Step 1: Generate transcription
     logger.info("Generating transcription...")
-    progress_meter.start()
+    in_main(progress_meter.configure, mode="indeterminate", text="transcribing")
+    in_main(progress_meter.start)
     transcription = Transcription.from_audio(audio_file)
-    progress_meter.stop()
-    progress_meter.configure(value=100)
+    in_main(progress_meter.stop)
+    in_main(progress_meter.configure, value=100)
     logger.success("Transcription generated.")
+    job.checkpoint()
 
     # Step 2: Get segments
-    word_timings = user_split_transcription(transcription)
+    word_timings = in_main(user_split_transcription, transcription)
     logger.success("Segments confirmed.")
+    job.checkpoint()
 
     # Step 3: Correct transcriptions
-    segments = user_correct_transcription(word_timings)
+    segments = in_main(user_correct_transcription, word_timings)
     logger.success("Corrections confirmed.")
+    job.checkpoint()
 
     # Step 4: Output to SRT
     dest = media_file.with_suffix(".srt")
@@ -130,13 +413,141 @@ def run(media_file: Path, progress_meter: ttkb.Floodgauge) -> None:
     logger.success(f"SRT file written: {dest}")
 
     # Step 5: Get subtitle configuration
-    fonts = get_system_fonts()
-    while (config := get_subtitle_config(fonts=fonts)) is None:
+    if not fonts.finished:
+        logger.info("Still searching for fonts. The font list will fill in as they are found.")
+
+    while (config := in_main(get_subtitle_config, fonts=fonts, media=media)) is None:
         logger.error("Configuration not processed. Try again.")
+        job.checkpoint()
+
+    # Step 5b: Output to WebVTT, now that we know where the subtitles go
+    dest = write_vtt(iter_cues(segments), dest=media_file.with_suffix(".vtt"), settings=vtt_settings(config))
+    logger.success(f"WebVTT file written: {dest}")
 
     # Step 6: Start building
-    image_dir = draw_subtitles(segments, config)
-    logger.success(f"Frames written to {image_dir}")
+    build_subtitles(segments, config, job=job, work_root=work_root)
+    save_job(output_path(config.source, ""), segments, config)
+
+
+def load_audio(media_file: Path) -> Path:
+    """Return the audio of the given media file, converting it if need be. Raises ValueError for invalid media."""
+    if is_audio_only(media_file):
+        logger.debug(f"{media_file} is already an audio file")
+        return media_file
+
+    logger.info(f"{media_file} is not an audio file. Converting...")
+    audio_file = audio_only(media_file)
+    logger.success(f"Conversion successful: {audio_file}")
+
+    return audio_file
+
+
+def fragment_timings(transcription: Transcription, fragments: Iterable[str]) -> list[WordTiming]:
+    """Find each fragment (a line of the transcription's text) in the transcription, skipping blank lines."""
+    segments = (transcription.get_fragment(f) for f in (f.strip() for f in fragments) if f)
+
+    # conflate each segment (a list of word timings) into one WordTiming, which is a bit of an abuse
+    # of the class, but at this point, we no longer care about the timing of the individual words, just
+    # the segment as a whole
+    return [WordTiming(word=str(s), start=s.start, end=s.end) for s in segments]
+
+
+def split_sentences(text: str) -> list[str]:
+    """Split text after each sentence-ending punctuation mark, for segmenting a transcription without a person."""
+    return [sentence for sentence in re.split(r"(?<=[.!?…])\s+", text.strip()) if sentence]
+
+
+def build_subtitles(segments: list[Segment], config: SubtitleConfig, job: JobControl | None = None, *,
+                    work_root: Path | None = None) -> None:
+    """Produce the subtitle output in whichever form the configuration asks for.
+
+    Intermediate files (sprites, concat scripts, chunks) go in a fresh directory under work_root (by default, the
+    system's temporary directory), which is removed once the output is written. Frames go in the job directory.
+    """
+    if config.render_cache:
+        SpriteCache().prune()
+
+    if config.output_mode is OutputMode.STREAM:
+        video = stream_subtitles(segments, config, job=job)
+        logger.success(f"Video written to {video}")
+    elif config.output_mode is OutputMode.ASS:
+        # ASS wrap style 0 is "smart" (balanced) wrapping, 1 is end-of-line (greedy) wrapping
+        wrap_style = 0 if config.line_breaking is LineBreaking.BALANCED else 1
+        script = write_ass(iter_cues(segments), dest=output_path(config.source, ".ass"), style=ass_style(config),
+                           play_res=config.canvas_size, wrap_style=wrap_style)
+        logger.success(f"ASS subtitles written to {script}")
+    elif config.output_mode is OutputMode.BURN_IN:
+        media = probe_media(config.source) if config.source is not None else None
+        if media is None or media.size is None:
+            logger.error("Burning in subtitles needs a source video.")
+            return
+
+        suffix = config.burn_in_encoder.suffix(media.path.suffix)
+        dest = media.path.with_name(f"{media.path.stem}-subtitled{suffix}")
+        total = media.duration or timeline_length(segments, config)
+
+        with work_directory(work_root, prefix="selene-") as work_dir:
+            script = draw_subtitle_states(segments, config, work_dir, job=job)
+            video = burn_in(media.path, script, offset=config.bounding_box.position, dest=dest,
+                            encoder=config.burn_in_encoder, threads=encoder_threads(),
+                            on_progress=encode_progress(job, total), job=job)
+
+        logger.success(f"Subtitled video written to {video}")
+    elif config.output_mode in (OutputMode.CONCAT, OutputMode.VFR):
+        with work_directory(work_root, prefix="selene-") as work_dir:
+            video = encode_subtitle_states(segments, config, work_dir, job=job)
+
+        logger.success(f"Video written to {video}")
+    else:
+        image_dir = draw_subtitles(segments, config, output_path(config.source, ""), job=job)
+        logger.success(f"Frames written to {image_dir}")
+
+
+def rerender_from_srt(job_dir: Path, srt: Path, job: JobControl | None = None, *,
+                      work_root: Path | None = None) -> None:
+    """Bring a previous job up to date with an edited SRT file, redoing as little work as possible.
+
+    For frame output, only the frames whose content changed are redrawn. For chunked video output, only the chunks
+    containing changes are re-encoded and joined back up with the rest. Other outputs are rebuilt in full, but every
+    unchanged segment's sprite comes straight from the render cache. The WebVTT export is rewritten either way.
+    """
+    try:
+        old_segments, config = load_job(job_dir)
+    except FileNotFoundError:
+        logger.error(f"{job_dir} does not contain a previous job.")
+        return
+
+    segments = segments_from_cues(read_srt(srt))
+    logger.info(f"Re-rendering {len(segments)} segments from {srt}...")
+
+    if config.render_cache:
+        SpriteCache().prune()
+
+    old_spans = subtitle_schedule(old_segments, config)
+    new_spans = subtitle_schedule(segments, config)
+    ranges = changed_ranges(old_spans, span_labels(old_spans, old_segments),
+                            new_spans, span_labels(new_spans, segments))
+
+    if config.output_mode is OutputMode.FRAMES:
+        frames = redraw_frames(segments, config, ranges, image_dir=job_dir, job=job)
+        logger.success(f"{frames} changed frames redrawn in {job_dir}")
+    elif chunked(config):
+        with work_directory(work_root, prefix="selene-") as work_dir:
+            video = reencode_changed_chunks(segments, config, ranges, work_dir, job=job)
+
+        if video is None:
+            logger.info("No previous chunks to splice into, so re-encoding in full.")
+            build_subtitles(segments, config, job=job, work_root=work_root)
+        else:
+            logger.success(f"Video written to {video}")
+    else:
+        build_subtitles(segments, config, job=job, work_root=work_root)
+
+    vtt = config.source.with_suffix(".vtt") if config.source is not None else srt.with_suffix(".vtt")
+    write_vtt(iter_cues(segments), dest=vtt, settings=vtt_settings(config))
+    logger.success(f"WebVTT file written: {vtt}")
+
+    save_job(job_dir, segments, config)
 
 
 def user_split_transcription(transcription: Transcription) -> list[WordTiming]:
@@ -152,14 +563,7 @@ def user_split_transcription(transcription: Transcription) -> list[WordTiming]:
     textbox.grid(row=1, column=0, **GRID_KW)  # type: ignore
 
     def process_splits():
-        fragments = (line.strip() for line in textbox.text.splitlines())
-        segments = (transcription.get_fragment(f) for f in fragments)
-
-        # conflate each segment (a list of word timings) into one WordTiming, which is a bit of an abuse
-        # of the class, but at this point, we no longer care about the timing of the individual words, just
-        # the segment as a whole
-        word_timings = [WordTiming(word=str(s), start=s.start, end=s.end) for s in segments]
-        window.return_(word_timings)
+        window.return_(fragment_timings(transcription, textbox.text.splitlines()))
 
     ttkb.Button(window, text="Confirm Segments", command=process_splits) \
         .grid(row=2, column=0, **GRID_KW)  # type: ignore
@@ -195,7 +599,8 @@ def user_correct_transcription(segments: list[WordTiming]) -> list[Segment]:
     return window.result() or []
 
 
-def get_subtitle_config(fonts: dict[str, Path]) -> SubtitleConfig | None:
+def get_subtitle_config(fonts: FontCatalogue, media: MediaInfo) -> SubtitleConfig | None:
+    """Have the user configure the subtitles, defaulting the canvas and framerate to those of the source media."""
     window: CToplevel[SubtitleConfig] = CToplevel(title="Σελήνη: Subtitle Configuration")
 
     # Subtitle bounding box
@@ -218,9 +623,14 @@ def get_subtitle_config(fonts: dict[str, Path]) -> SubtitleConfig | None:
     ttkb.Label(window, text="Subtitle font") \
         .grid(row=2, column=0, **GRID_KW)  # type: ignore
 
-    font_selector = CCombobox(window, options=list(fonts.keys()), mapfunc=fonts.__getitem__)
+    font_selector = CCombobox(window, options=sorted(fonts.fonts), mapfunc=fonts.fonts.__getitem__)
     font_selector.grid(row=2, column=1, columnspan=2, **GRID_KW)  # type: ignore
 
+    def refresh_fonts():
+        font_selector.set_options(sorted(fonts.fonts))
+
+    fonts.subscribe(refresh_fonts)
+
     # Font size
     ttkb.Label(window, text="Font size (pt)") \
         .grid(row=2, column=3, **GRID_KW)  # type: ignore
@@ -252,9 +662,43 @@ def get_subtitle_config(fonts: dict[str, Path]) -> SubtitleConfig | None:
 
     ttkb.Label(window, text="Video Framerate (fps)") \
         .grid(row=4, column=0, **GRID_KW)  # type: ignore
-    fps_entry = CEntry(window, text="30.0", converter=float, validator=0.0.__lt__)
+    fps_entry = CEntry(window, text=str(media.fps or DEFAULT_FPS), converter=Fraction, validator=Fraction(0).__lt__)
     fps_entry.grid(row=4, column=1, **GRID_KW)  # type: ignore
 
+    ttkb.Label(window, text="Output") \
+        .grid(row=5, column=0, **GRID_KW)  # type: ignore
+    output_selector = CCombobox(window, options=[m.name for m in OutputMode], mapfunc=OutputMode.__getitem__)
+    output_selector.value = OutputMode.FRAMES.name
+    output_selector.grid(row=5, column=1, columnspan=2, **GRID_KW)  # type: ignore
+
+    ttkb.Label(window, text="Render workers") \
+        .grid(row=5, column=3, **GRID_KW)  # type: ignore
+    workers_entry = CEntry(window, text=str(os.cpu_count() or 1), converter=int, validator=(0).__lt__)
+    workers_entry.grid(row=5, column=4, **GRID_KW)  # type: ignore
+
+    ttkb.Label(window, text="Line breaking") \
+        .grid(row=6, column=0, **GRID_KW)  # type: ignore
+    line_breaking_selector = CCombobox(window, options=[b.name for b in LineBreaking],
+                                       mapfunc=LineBreaking.__getitem__)
+    line_breaking_selector.value = LineBreaking.GREEDY.name
+    line_breaking_selector.grid(row=6, column=1, columnspan=2, **GRID_KW)  # type: ignore
+
+    auto_fit_switch = CSwitch(window, text="Shrink to fit box?", bootstyle="info.RoundToggle.Toolbutton")
+    auto_fit_switch.grid(row=6, column=3, **GRID_KW)  # type: ignore
+
+    ttkb.Label(window, text="Encoder") \
+        .grid(row=7, column=0, **GRID_KW)  # type: ignore
+    encoder_selector = CCombobox(window, options=[e.name for e in Encoder], mapfunc=Encoder.__getitem__)
+    encoder_selector.value = Encoder.VP9_GOOD.name
+    encoder_selector.grid(row=7, column=1, columnspan=2, **GRID_KW)  # type: ignore
+
+    ttkb.Label(window, text="Burn-in encoder") \
+        .grid(row=7, column=3, **GRID_KW)  # type: ignore
+    burn_in_encoder_selector = CCombobox(window, options=[e.name for e in BurnInEncoder],
+                                         mapfunc=BurnInEncoder.__getitem__)
+    burn_in_encoder_selector.value = BurnInEncoder.H264.name
+    burn_in_encoder_selector.grid(row=7, column=4, **GRID_KW)  # type: ignore
+
     def interpret():
         bounding_box = BoundingBox(x=bbox_x_entry.value, y=bbox_y_entry.value, width=bbox_w_entry.value,
                                    height=bbox_h_entry.value)
@@ -267,58 +711,584 @@ def get_subtitle_config(fonts: dict[str, Path]) -> SubtitleConfig | None:
             end_time=end_time_entry.value,
             ligatures=ligature_switch.checked,
             alignment=alignment_selector.value,
-            fps=fps_entry.value
+            fps=fps_entry.value,
+            output_mode=output_selector.value,
+            workers=workers_entry.value,
+            line_breaking=line_breaking_selector.value,
+            auto_fit=auto_fit_switch.checked,
+            encoder=encoder_selector.value,
+            burn_in_encoder=burn_in_encoder_selector.value,
+            canvas_size=media.size or DEFAULT_CANVAS_SIZE,
+            duration=media.duration,
+            source=media.path
         )
         window.return_(config)
 
     ttkb.Button(window, text="Generate", command=interpret) \
         .grid(row=100, column=0, columnspan=5, **GRID_KW)  # type: ignore
 
-    return window.result()
+    try:
+        return window.result()
+    finally:
+        fonts.unsubscribe(refresh_fonts)
+
 
+def sprite_key(text: str, config: SubtitleConfig) -> str:
+    """Digest everything which affects how a segment's sprite looks."""
+    font_stat = config.font.stat()
 
-def draw_subtitles(segments: list[Segment], config: SubtitleConfig) -> Path:
-    """Render the subtitles onto the appropriate frames, returning the folder into which they are saved."""
-    image_dir = Path("subtitle-images")
-    image_dir.mkdir(exist_ok=True)
-    clear_directory(image_dir)
+    return cache_key(
+        text, str(config.font.resolve()), font_stat.st_mtime_ns, font_stat.st_size, config.fontsize,
+        config.bounding_box.size, config.alignment.value, config.ligatures, config.line_breaking.value,
+        config.auto_fit, renderer_version()
+    )
 
-    frame = 0
-    blank_image = transparent_image(width=1920, height=1080)
 
-    for segment in segments:
-        start_frame = int(segment.start * config.fps)
-        end_frame = int(segment.end * config.fps)
-        logger.debug(f"Segment: {segment!r} || {start_frame}-{end_frame}")
+def render_segment(text: str, config: SubtitleConfig) -> Image.Image:
+    """Render a single segment's text onto a transparent sprite the size of the subtitle bounding box.
+
+    If the render cache is enabled, identical sprites from earlier runs are reused rather than redrawn.
+    """
+    cache = SpriteCache() if config.render_cache else None
+    key = sprite_key(text, config) if cache is not None else ""
+
+    if cache is not None and (sprite := cache.get(key)) is not None:
+        return sprite
+
+    background = transparent_image(*config.bounding_box.size)
+    width = config.bounding_box.width
+    font = load_font(config.font, size=config.fontsize)
+
+    sprite = render_text(image=background, text=text, font=font, pos=(0, 0), width=width, align=config.alignment,
+                         ligatures=config.ligatures, line_breaking=config.line_breaking,
+                         fit_height=config.bounding_box.height if config.auto_fit else None)
+
+    if cache is not None:
+        cache.put(key, sprite)
+
+    return sprite
+
+
+def place_on_canvas(sprite: Image.Image, config: SubtitleConfig) -> Image.Image:
+    """Paste a bounding-box sprite into position on a full, otherwise transparent frame."""
+    canvas = transparent_image(*config.canvas_size)
+    canvas.paste(sprite, config.bounding_box.position)
+
+    return canvas
+
+
+def subtitle_schedule(segments: list[Segment], config: SubtitleConfig) -> list[Run]:
+    """Lay the segments out on the video's frame grid. Each run's key is the index of its segment."""
+    intervals = ((segment.start, segment.end) for segment in segments)
+    return schedule(intervals, fps=config.fps, duration=config.duration)
+
+
+def timeline_length(segments: list[Segment], config: SubtitleConfig) -> Fraction:
+    """Return the exact length (in seconds) of the subtitle video."""
+    spans = subtitle_schedule(segments, config)
+    return frame_to_time(spans[-1].end, config.fps) if spans else Fraction(0)
+
+
+def encode_progress(job: JobControl | None, total: float | Fraction) -> Callable[[float], None] | None:
+    """Return a callback reporting ffmpeg's progress (in seconds of output) to the job, if there is one."""
+    if job is None:
+        return None
+
+    return lambda seconds: job.progress("encode", seconds, float(total), unit="s")
+
+
+def span_labels(spans: list[Run], segments: list[Segment]) -> list[str | None]:
+    """Label each span with the text it shows (None for blanks), so schedules can be compared by content."""
+    return [None if span.key is None else str(segments[span.key]) for span in spans]
+
 
-        background = transparent_image(width=1920, height=1080)
-        text = str(segment)
-        pos = config.bounding_box.x, config.bounding_box.y
-        width = config.bounding_box.width
-        font = ImageFont.truetype(str(config.font), size=config.fontsize)
+def iter_runs(segments: list[Segment], config: SubtitleConfig, job: JobControl | None = None, *,
+              spans: list[Run] | None = None) -> Iterator[tuple[Image.Image, Run]]:
+    """Yield each sprite of the subtitle video along with the span of frames it is shown for.
+
+    Only the given spans are rendered, if given any (by default, the whole schedule). With more than one worker
+    configured, the segments are rendered in a process pool, but still yielded in order.
+    """
+    blank_image = transparent_image(*config.bounding_box.size)
+    if spans is None:
+        spans = subtitle_schedule(segments, config)
+
+    texts = [str(segments[span.key]) for span in spans if span.key is not None]
+
+    if config.workers > 1:
+        with ProcessPoolExecutor(max_workers=config.workers) as executor:
+            sprites = bounded_map(executor, render_segment, texts, repeat(config), window=4 * config.workers)
+            yield from _pair_sprites(spans, sprites, blank_image, job)
+    else:
+        sprites = map(render_segment, texts, repeat(config))
+        yield from _pair_sprites(spans, sprites, blank_image, job)
 
-        subtitled = render_text(image=background, text=text, font=font, pos=pos, width=width, align=config.alignment)
 
-        for i in range(frame, start_frame):
-            blank_image.save(image_dir / f"frame-{i:06}.png")
+def _pair_sprites(spans: list[Run], sprites: Iterator[Image.Image], blank_image: Image.Image,
+                  job: JobControl | None) -> Iterator[tuple[Image.Image, Run]]:
+    """Match the rendered segment sprites back up with their spans, filling the gaps with the blank image.
 
-        for i in range(start_frame, end_frame + 1):
-            subtitled.save(image_dir / f"frame-{i:06}.png")
+    Progress is reported (in frames) once the consumer has finished with each span.
+    """
+    total_frames = sum(span.frames for span in spans)
+    done = 0
+
+    for span in spans:
+        if job is not None:
+            job.checkpoint()
+
+        if span.key is None:
+            yield blank_image, span
+        else:
+            logger.debug(f"Segment {span.key} || {span.start}-{span.end}")
+            yield next(sprites), span
 
-        frame = end_frame
+        done += span.frames
+        if job is not None:
+            job.progress("render", done, total_frames)
+
+
+def iter_frames(segments: list[Segment], config: SubtitleConfig,
+                job: JobControl | None = None) -> Iterator[Image.Image]:
+    """Yield the sprite for every frame of the subtitle video, in order.
+
+    Repeated frames are yielded as the same image object, so consumers can cheaply detect them.
+    """
+    for image, span in iter_runs(segments, config, job=job):
+        yield from repeat(image, span.frames)
+
+
+def draw_subtitles(segments: list[Segment], config: SubtitleConfig, image_dir: Path,
+                   job: JobControl | None = None) -> Path:
+    """Render the subtitles onto the appropriate frames in image_dir (replacing any already there), returning it.
+
+    Each distinct image is only encoded once; every other frame showing it is a hardlink to that first file.
+    """
+    image_dir.mkdir(parents=True, exist_ok=True)
+    clear_directory(image_dir, glob="frame-*.png")
 
+    # content digest -> first file written with that content
+    written: dict[bytes, Path] = {}
+    previous: Image.Image | None = None
+    source = Path()
+
+    for i, image in enumerate(iter_frames(segments, config, job=job)):
+        dest = image_dir / f"frame-{i:06}.png"
+
+        if image is not previous:
+            previous = image
+            digest = image_digest(image)
+
+            if digest not in written:
+                place_on_canvas(image, config).save(dest)
+                written[digest] = dest
+                source = dest
+                continue
+
+            source = written[digest]
+
+        link_or_copy(source, dest)
+
+    logger.debug(f"{len(written)} distinct images encoded")
     return image_dir
 
 
+def redraw_frames(segments: list[Segment], config: SubtitleConfig, ranges: list[tuple[int, int]],
+                  image_dir: Path, job: JobControl | None = None) -> int:
+    """Redraw just the given frame ranges of an existing frame directory, returning how many frames were written.
+
+    Frames past the end of the new schedule are removed.
+    """
+    spans = subtitle_schedule(segments, config)
+    blank_image = transparent_image(*config.bounding_box.size)
+    last_frame = spans[-1].end if spans else 0
+    written = 0
+
+    for start, end in ranges:
+        for span in clip_runs(spans, start, end):
+            if job is not None:
+                job.checkpoint()
+
+            sprite = blank_image if span.key is None else render_segment(str(segments[span.key]), config)
+
+            # frames may be hardlinked together, so always unlink before writing rather than overwriting in place
+            first = image_dir / f"frame-{span.start:06}.png"
+            first.unlink(missing_ok=True)
+            place_on_canvas(sprite, config).save(first)
+
+            for i in range(span.start + 1, span.end):
+                dest = image_dir / f"frame-{i:06}.png"
+                dest.unlink(missing_ok=True)
+                link_or_copy(first, dest)
+
+            written += span.frames
+
+        for i in range(max(start, last_frame), end):
+            (image_dir / f"frame-{i:06}.png").unlink(missing_ok=True)
+
+    return written
+
+
+def iter_states(segments: list[Segment], config: SubtitleConfig, image_dir: Path,
+                job: JobControl | None = None) -> Iterator[tuple[Path, Run]]:
+    """Save one sprite per distinct subtitle state into image_dir, yielding which sprite each span shows."""
+    return write_states(iter_runs(segments, config, job=job), image_dir)
+
+
+def write_states(runs: Iterable[tuple[Image.Image, Run]], image_dir: Path) -> Iterator[tuple[Path, Run]]:
+    """Save each distinct sprite into image_dir (once), yielding which file each span shows."""
+    # content digest -> file written with that content
+    written: dict[bytes, Path] = {}
+
+    for image, span in runs:
+        digest = image_digest(image)
+
+        if (path := written.get(digest)) is None:
+            path = image_dir / f"state-{len(written):06}.png"
+            image.save(path)
+            written[digest] = path
+
+        yield path, span
+
+
+def render_states(segments: list[Segment], config: SubtitleConfig, image_dir: Path,
+                  job: JobControl | None = None) -> list[tuple[Path, Run]]:
+    """As iter_states, but rendering everything up front."""
+    return list(iter_states(segments, config, image_dir, job=job))
+
+
+def draw_subtitle_states(segments: list[Segment], config: SubtitleConfig, image_dir: Path,
+                         job: JobControl | None = None) -> Path:
+    """Render one sprite per distinct subtitle state into image_dir, returning an ffmpeg concat script which times them.
+
+    The sprites are only the size of the bounding box, and are positioned on the canvas when encoding.
+    """
+    states = render_states(segments, config, image_dir, job=job)
+    entries = [(path, span.duration(config.fps)) for path, span in states]
+
+    return write_concat_script(entries, dest=image_dir / "frames.ffconcat", framerate=config.fps)
+
+
+def chunked(config: SubtitleConfig) -> bool:
+    """Whether the video is encoded in chunks (see encode_subtitle_states)."""
+    return config.output_mode is OutputMode.CONCAT and config.workers > 1
+
+
+def chunk_parts(chunk_dir: Path, config: SubtitleConfig, count: int) -> list[Path]:
+    """The encoded parts of a chunked video, in the given directory."""
+    return [chunk_dir / f"chunk-{i:03}{config.encoder.suffix}" for i in range(count)]
+
+
+def encode_subtitle_states(segments: list[Segment], config: SubtitleConfig, work_dir: Path,
+                           job: JobControl | None = None) -> Path:
+    """Render the subtitle states (into work_dir) and encode them, returning the path to the video.
+
+    At a constant frame rate, the timeline is split at blank gaps into one chunk per worker, each chunk is handed to
+    its own ffmpeg process as soon as its sprites are rendered, and the results are joined without re-encoding.
+    Unless config.keep_chunks is off, the parts are kept in the job directory (along with where each chunk starts and
+    ends), so that a re-render only has to re-encode the chunks which changed. This is a second copy of the whole
+    video, which stays until the job directory is deleted. Variable frame rate output is encoded in one piece, since
+    its chunks wouldn't end on exact frame boundaries.
+    """
+    dest = output_path(config.source, config.encoder.suffix)
+    on_progress = encode_progress(job, timeline_length(segments, config))
+
+    if not chunked(config):
+        script = draw_subtitle_states(segments, config, work_dir, job=job)
+        logger.debug(f"Concat script written to {script}")
+        spans = subtitle_schedule(segments, config)
+        return images_to_video(str(script), fps=config.fps, variable_frame_rate=config.output_mode is OutputMode.VFR,
+                               dest=dest, canvas=config.canvas_size, offset=config.bounding_box.position,
+                               encoder=config.encoder, threads=encoder_threads(),
+                               frames=spans[-1].end if spans else 0, on_progress=on_progress, job=job)
+
+    chunks = split_at_gaps(subtitle_schedule(segments, config), config.workers)
+    chunk_dir = output_path(config.source, "") / "chunks"
+
+    # whether or not they're kept this time, any parts from before no longer match the video
+    if chunk_dir.is_dir():
+        clear_directory(chunk_dir)
+        chunk_dir.rmdir()
+
+    if config.keep_chunks:
+        chunk_dir.mkdir(parents=True)
+    else:
+        chunk_dir = work_dir
+
+    parts = chunk_parts(chunk_dir, config, len(chunks))
+    states = iter_states(segments, config, work_dir, job=job)
+
+    def scripts() -> Iterator[Chunk]:
+        for i, chunk in enumerate(chunks):
+            # zip stops at the end of the chunk without taking (and so rendering) the next chunk's first state
+            entries = [(path, span.duration(config.fps)) for _, (path, span) in zip(chunk, states)]
+            script = write_concat_script(entries, dest=work_dir / f"chunk-{i:03}.ffconcat", framerate=config.fps)
+            yield Chunk(script, frames=sum(span.frames for span in chunk), part=parts[i])
+
+        # let the renderer run to completion, so it reports its progress and shuts its workers down
+        next(states, None)
+
+    logger.info(f"Encoding in {len(chunks)} chunks...")
+    video = encode_in_chunks(scripts(), fps=config.fps, dest=dest, workers=config.workers,
+                             canvas=config.canvas_size, offset=config.bounding_box.position, encoder=config.encoder,
+                             threads=encoder_threads(len(chunks)), on_progress=on_progress, job=job)
+
+    if config.keep_chunks:
+        bounds = [[chunk[0].start, chunk[-1].end] for chunk in chunks]
+        (chunk_dir / CHUNK_MANIFEST).write_text(json.dumps(bounds), encoding="utf-8")
+
+    return video
+
+
+def reencode_changed_chunks(segments: list[Segment], config: SubtitleConfig, ranges: list[tuple[int, int]],
+                            work_dir: Path, job: JobControl | None = None) -> Path | None:
+    """Re-encode just the chunks of a previous chunked encode which overlap the changed frame ranges, then join them
+    back up with the untouched parts, returning the path to the video.
+
+    Returns None (having changed nothing) if there is no complete previous encode to splice into, or if the timeline
+    has changed length.
+    """
+    dest = output_path(config.source, config.encoder.suffix)
+    chunk_dir = output_path(config.source, "") / "chunks"
+    manifest = chunk_dir / CHUNK_MANIFEST
+
+    try:
+        bounds: list[tuple[int, int]] = [(start, end) for start, end in json.loads(manifest.read_text("utf-8"))]
+    except (OSError, ValueError):
+        return None
+
+    spans = subtitle_schedule(segments, config)
+    parts = chunk_parts(chunk_dir, config, len(bounds))
+    if not bounds or not spans or spans[-1].end != bounds[-1][1] or not all(part.is_file() for part in parts):
+        return None
+
+    changed = [i for i, (start, end) in enumerate(bounds) if any(low < end and start < high for low, high in ranges)]
+    logger.info(f"Re-encoding {len(changed)} of {len(bounds)} chunks...")
+
+    # until the splice is complete, the parts on disk don't all match any one schedule
+    manifest.unlink()
+
+    clipped = {i: clip_runs(spans, *bounds[i]) for i in changed}
+    states = write_states(iter_runs(segments, config, job=job, spans=[run for i in changed for run in clipped[i]]),
+                          image_dir=work_dir)
+
+    def scripts() -> Iterator[Chunk]:
+        for i in changed:
+            # as in encode_subtitle_states, zip stops without taking the next chunk's first state
+            entries = [(path, span.duration(config.fps)) for _, (path, span) in zip(clipped[i], states)]
+            script = write_concat_script(entries, dest=work_dir / f"chunk-{i:03}.ffconcat", framerate=config.fps)
+            yield Chunk(script, frames=bounds[i][1] - bounds[i][0], part=parts[i])
+
+        next(states, None)
+
+    total = sum(bounds[i][1] - bounds[i][0] for i in changed) / config.fps
+    encode_parts(scripts(), fps=config.fps, workers=config.workers, canvas=config.canvas_size,
+                 offset=config.bounding_box.position, encoder=config.encoder,
+                 threads=encoder_threads(min(len(changed), config.workers)), on_progress=encode_progress(job, total),
+                 job=job)
+    video = concat_videos(parts, dest, job=job)
+
+    manifest.write_text(json.dumps(bounds), encoding="utf-8")
+    return video
+
+
+def stream_subtitles(segments: list[Segment], config: SubtitleConfig, job: JobControl | None = None) -> Path:
+    """Render the subtitles and pipe the frames directly into ffmpeg, returning the path to the video."""
+    dest = output_path(config.source, config.encoder.suffix)
+    return frames_to_video(iter_frames(segments, config, job=job), size=config.bounding_box.size, fps=config.fps,
+                           dest=dest, canvas=config.canvas_size, offset=config.bounding_box.position,
+                           encoder=config.encoder, threads=encoder_threads(), job=job)
+
+
+def read_subtitle_config(path: Path) -> dict:
+    """Read the [subtitles] table of a TOML file, in the form that config_from_dict takes.
+
+    Settings which come from the media itself (canvas size, duration, ...) may be left out; see headless_config.
+    The font may be given either as a path or by name, as in the configuration dialog.
+    """
+    with open(path, "rb") as f:
+        data = tomllib.load(f).get("subtitles")
+
+    if not isinstance(data, dict):
+        raise ValueError("no [subtitles] table")
+
+    if "font" not in data:
+        raise ValueError("missing settings: font")
+
+    if not Path(data["font"]).is_file():
+        fonts = get_system_fonts()
+        if data["font"] not in fonts:
+            raise ValueError(f"font not found: {data['font']}")
+
+        data["font"] = str(fonts[data["font"]])
+
+    return data
+
+
+def headless_config(data: dict, media: MediaInfo) -> SubtitleConfig:
+    """Build the subtitle configuration for the given media, taking the canvas, framerate and duration from it
+    (as the configuration dialog does) unless the settings say otherwise.
+    """
+    defaults = dict(
+        start_time=0.0,
+        end_time=math.inf,
+        ligatures=True,
+        alignment=TextAlignment.CENTRE.name,
+        fps=str(media.fps or DEFAULT_FPS),
+        canvas_size=list(media.size or DEFAULT_CANVAS_SIZE),
+        duration=media.duration,
+        source=str(media.path)
+    )
+
+    return config_from_dict(defaults | data)
+
+
+def headless_segments(media_file: Path, segments_file: Path | None) -> list[Segment]:
+    """Segment the media's transcription without asking anyone.
+
+    The segments are read straight from an SRT file if given one (without transcribing at all), found line by line
+    in the transcription if given a pre-segmented text file, and otherwise split from the transcription by sentence.
+    """
+    if segments_file is not None and segments_file.suffix.lower() == ".srt":
+        return segments_from_cues(read_srt(segments_file))
+
+    audio_file = load_audio(media_file)
+
+    logger.info("Generating transcription...")
+    transcription = Transcription.from_audio(audio_file)
+    logger.success("Transcription generated.")
+
+    if segments_file is not None:
+        fragments = segments_file.read_text(encoding="utf-8").splitlines()
+    else:
+        fragments = split_sentences(str(transcription))
+
+    return [Segment(words=[timing], wait_after=0.0) for timing in fragment_timings(transcription, fragments)]
+
+
+def run_headless(media_file: Path, subtitle_config: dict, segments_file: Path | None = None,
+                 job: JobControl | None = None, *, work_root: Path | None = None) -> None:
+    """Run the whole pipeline for one media file, without any GUI."""
+    logger.info(f"Processing {media_file}...")
+    job = job or JobControl()
+    media = probe_media(media_file)
+    logger.debug(f"{media_file}: {media}")
+
+    # before transcribing, so that a bad setting fails fast
+    config = headless_config(subtitle_config, media)
+
+    segments = headless_segments(media_file, segments_file)
+    logger.success(f"{len(segments)} segments found.")
+    job.checkpoint()
+
+    dest = media_file.with_suffix(".srt")
+    if segments_file is None or segments_file.resolve() != dest.resolve():
+        Transcription.write_srt(segments, dest=dest)
+        logger.success(f"SRT file written: {dest}")
+
+    dest = write_vtt(iter_cues(segments), dest=media_file.with_suffix(".vtt"), settings=vtt_settings(config))
+    logger.success(f"WebVTT file written: {dest}")
+
+    build_subtitles(segments, config, job=job, work_root=work_root)
+    save_job(output_path(config.source, ""), segments, config)
+
+
+def find_media(paths: Iterable[Path]) -> list[Path]:
+    """Expand any directories into the media files they contain, leaving out selene's own output."""
+    media_files: list[Path] = []
+
+    for path in paths:
+        if not path.is_dir():
+            media_files.append(path)
+            continue
+
+        media_files.extend(
+            f for f in sorted(path.iterdir())
+            if f.is_file() and f.suffix.lower() in MEDIA_SUFFIXES and not f.stem.endswith(("-subtitles", "-subtitled"))
+        )
+
+    return media_files
+
+
+def find_segments(media_file: Path, segments: Path | None) -> Path | None:
+    """Find the segments for the given media: either the given file, or its namesake in the given directory."""
+    if segments is None or not segments.is_dir():
+        return segments
+
+    for suffix in (".srt", ".txt"):
+        if (candidate := segments / f"{media_file.stem}{suffix}").is_file():
+            return candidate
+
+    logger.warning(f"No segments for {media_file} in {segments}, so splitting its transcription by sentence.")
+    return None
+
+
+def cli(argv: Sequence[str] | None = None) -> int:
+    """Generate subtitles for each of the given media files without any GUI, returning the exit status."""
+    parser = argparse.ArgumentParser(prog="selene", description="Generate on-screen subtitles, without a GUI.")
+    parser.add_argument("media", type=Path, nargs="+", help="media files, or directories of them")
+    parser.add_argument("-c", "--config", type=Path, required=True,
+                        help="TOML file whose [subtitles] table holds the subtitle configuration")
+    parser.add_argument("-s", "--segments", type=Path,
+                        help="pre-segmented text file (one segment per line) or SRT file, or a directory of them "
+                             "named after each media file. Otherwise, each transcription is split by sentence.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of media files to process at once")
+    parser.add_argument("-w", "--work-root", type=Path,
+                        help="directory in which each job gets its own working directory, removed once the job "
+                             "succeeds (default: the system's temporary directory)")
+    args = parser.parse_args(argv)
+
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    media_files = find_media(args.media)
+    if args.segments is not None and args.segments.is_file() and len(media_files) > 1:
+        parser.error("a single segments file can only be used with a single media file")
+
+    try:
+        subtitle_config = read_subtitle_config(args.config)
+        # check the settings once up front (against media with nothing known about it), rather than in every job
+        headless_config(subtitle_config, MediaInfo(args.config, None, None, None, None))
+    except OSError as e:
+        parser.error(f"cannot read subtitle configuration {args.config}: {e}")
+    except (tomllib.TOMLDecodeError, TypeError, ValueError) as e:
+        parser.error(f"invalid subtitle configuration {args.config}: {e}")
+
+    failures = 0
+
+    # every job has its own working directory and outputs, so they can safely run side by side
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {
+            executor.submit(run_headless, media_file, subtitle_config, find_segments(media_file, args.segments),
+                            work_root=args.work_root): media_file
+            for media_file in media_files
+        }
+
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception:
+                logger.exception(f"Failed to process {futures[future]}.")
+                failures += 1
+
+    logger.info(f"{len(media_files) - failures}/{len(media_files)} media files processed.")
+    return 1 if failures else 0
+
+
 def main():
     with open("./config.toml", "rb") as f:
         config = tomllib.load(f)["selene"]
 
     theme = config.pop("theme", "darkly")
+    work_root = config.pop("work_root", None)
 
-    app = Selene("Σελήνη", themename=theme, **config)
+    app = Selene("Σελήνη", themename=theme, work_root=Path(work_root) if work_root else None, **config)
     app.mainloop()
 
 
 if __name__ == "__main__":
+    # with any arguments, run headless; otherwise, open the GUI
+    if len(sys.argv) > 1:
+        sys.exit(cli())
+
     main()
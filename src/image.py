@@ -1,50 +1,297 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from enum import Enum
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterator
 
-from PIL import Image, ImageDraw, ImageFont
+import PIL
+from PIL import Image, ImageDraw, ImageFont, features
 from loguru import logger
 from matplotlib import font_manager
 
 from src.ui import TextAlignment
+from src.utils import pairwise, user_cache_dir
 
 
-def get_system_fonts() -> dict[str, Path]:
-    """Return a list of all fonts on the system.
+def _font_signature(filename: str) -> list[int]:
+    """Identify a particular version of a font file, so that we can tell when it has changed."""
+    stat = Path(filename).stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _load_font_index(index_file: Path) -> dict[str, dict]:
+    try:
+        return json.loads(index_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_font_index(index: dict[str, dict], index_file: Path) -> None:
+    # the temporary file is per-process, since several jobs may be refreshing the index at once
+    temp = index_file.with_suffix(f".{os.getpid()}.tmp")
+    temp.write_text(json.dumps(index), encoding="utf-8")
+    temp.replace(index_file)
+
+
+def _read_font_name(filename: str) -> str:
+    font = ImageFont.FreeTypeFont(filename)
+    name, weight = font.getname()
+    return f"{name} ({weight})"
+
+
+def iter_system_fonts(index_file: Path | None = None, workers: int | None = None) -> Iterator[tuple[str, Path]]:
+    """Yield the (name, path) of each font on the system, as it is found.
     https://stackoverflow.com/a/75314833
+
+    Font names are kept in an on-disk index keyed by each file's modification time and size, so only new or changed
+    font files need to be opened. Indexed fonts are yielded immediately; the rest are opened in a thread pool and
+    yielded as they finish, so the order is not guaranteed.
     """
-    fonts: dict[str, Path] = {}
+    if index_file is None:
+        index_file = user_cache_dir() / "font-index.json"
+
+    index = _load_font_index(index_file)
+    updated: dict[str, dict] = {}
+    unindexed: dict[str, list[int]] = {}
 
     for filename in sorted(font_manager.findSystemFonts()):
         if "Emoji" in filename or "18030" in filename:
             logger.debug(f"ignoring font file: {filename}")
             continue
 
-        font = ImageFont.FreeTypeFont(filename)
-        name, weight = font.getname()
-        fonts[f"{name} ({weight})"] = Path(filename)
+        try:
+            signature = _font_signature(filename)
+        except OSError:
+            logger.debug(f"cannot read font file: {filename}")
+            continue
+
+        entry = index.get(filename)
+        if entry is None or entry["signature"] != signature:
+            unindexed[filename] = signature
+            continue
+
+        updated[filename] = entry
+        yield entry["name"], Path(filename)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_read_font_name, filename): filename for filename in unindexed}
+
+        for future in as_completed(futures):
+            filename = futures[future]
+
+            try:
+                name = future.result()
+            except OSError:
+                logger.debug(f"cannot open font file: {filename}")
+                continue
+
+            updated[filename] = {"signature": unindexed[filename], "name": name}
+            yield name, Path(filename)
+
+    if updated != index:
+        try:
+            _save_font_index(updated, index_file)
+        except OSError:
+            logger.warning(f"could not save font index to {index_file}")
+
+
+def get_system_fonts(index_file: Path | None = None) -> dict[str, Path]:
+    """Return a list of all fonts on the system."""
+    return dict(iter_system_fonts(index_file))
+
+
+@lru_cache(maxsize=64)
+def load_font(path: Path, size: int, layout_engine: ImageFont.Layout | None = None) -> ImageFont.FreeTypeFont:
+    """Load the given font file at the given size, reusing previously loaded fonts where possible."""
+    return ImageFont.truetype(str(path), size=size, layout_engine=layout_engine)
+
+
+def font_features(font: ImageFont.ImageFont | ImageFont.FreeTypeFont, ligatures: bool) -> list[str] | None:
+    """Determine the OpenType features to draw with. These are only supported with the raqm layout engine."""
+    if ligatures or getattr(font, "layout_engine", None) != ImageFont.Layout.RAQM:
+        return None
+
+    return ["-liga", "-clig"]
+
+
+class TextMeasurer:
+    """Measure the advance widths of text in one font, remembering every word and word boundary it has measured.
+
+    The width of a line is the sum of its words' widths plus, at each space, a join width which includes the space
+    itself and any kerning between it and the neighbouring characters.
+    """
+
+    def __init__(self, font: ImageFont.ImageFont | ImageFont.FreeTypeFont, ligatures: bool = True) -> None:
+        self.font = font
+        self.features = font_features(font, ligatures)
+        self._widths: dict[str, float] = {}
+        self._joins: dict[tuple[str, str], float] = {}
+
+        # the vertical metrics ImageDraw.multiline_text lays lines out with (at its default spacing of 4px)
+        self.line_spacing = font.getbbox("A")[3] + 4
+        ascent, descent = font.getmetrics()
+        self.line_height = ascent + descent
+
+    def width(self, text: str) -> float:
+        """Return the advance width of the given text (which should not contain any line breaks)."""
+        if (width := self._widths.get(text)) is None:
+            width = self._widths[text] = self.font.getlength(text, features=self.features)
+
+        return width
+
+    def join(self, left: str, right: str) -> float:
+        """Return the extra width added by joining two words with a space."""
+        key = left[-1], right[0]
+
+        if (width := self._joins.get(key)) is None:
+            a, b = key
+            width = self._joins[key] = self.width(f"{a} {b}") - self.width(a) - self.width(b)
+
+        return width
+
+    def line_width(self, words: list[str]) -> float:
+        """Return the width of the given words, joined by single spaces."""
+        if not words:
+            return 0.0
+
+        return sum(map(self.width, words)) + sum(self.join(a, b) for a, b in pairwise(words))
+
+    def block_height(self, lines: int) -> float:
+        """Return the height of a block of text with the given number of lines."""
+        return (lines - 1) * self.line_spacing + self.line_height if lines else 0.0
+
+
+@lru_cache(maxsize=64)
+def text_measurer(font: ImageFont.ImageFont | ImageFont.FreeTypeFont, ligatures: bool = True) -> TextMeasurer:
+    """Return the (shared) measurer for the given font."""
+    return TextMeasurer(font, ligatures)
+
+
+class LineBreaking(Enum):
+    GREEDY = "greedy"  # fill each line as far as it will go
+    BALANCED = "balanced"  # minimise the raggedness of all the lines together
+
+
+def greedy_breaks(words: list[str], measure: TextMeasurer, width: float) -> list[list[str]]:
+    """Fill each line with as many words as will fit. A word too long to fit on a line by itself gets its own line."""
+    lines: list[list[str]] = []
+    current_width = 0.0
+
+    for word in words:
+        if lines:
+            extended = current_width + measure.join(lines[-1][-1], word) + measure.width(word)
+
+            if extended <= width:
+                # It will fit, so put it on this line.
+                lines[-1].append(word)
+                current_width = extended
+                continue
+
+        # It won't fit, so add it to the next line.
+        lines.append([word])
+        current_width = measure.width(word)
+
+    return lines
 
-    return fonts
 
+def balanced_breaks(words: list[str], measure: TextMeasurer, width: float) -> list[list[str]]:
+    """Break the words into lines which fit the width and are as even as possible.
 
-def wrap_text(text: str, font: ImageFont.ImageFont | ImageFont.FreeTypeFont, width: int) -> str:
+    This is a Knuth-Plass style dynamic program over the cached word widths: the cost of a layout is the sum of the
+    squared slack on every line (the last line included, since subtitle lines should look balanced), plus a fixed
+    penalty per line so that fewer lines are always preferred. A word too long to fit on a line by itself gets its
+    own line.
+    """
+    n = len(words)
+    if n == 0:
+        return []
+
+    # prefix sums, so that the width of words[i:j] is (advance[j] - advance[i]) + (joins[j - 1] - joins[i])
+    advance = [0.0]
+    for word in words:
+        advance.append(advance[-1] + measure.width(word))
+
+    joins = [0.0]
+    for a, b in pairwise(words):
+        joins.append(joins[-1] + measure.join(a, b))
+
+    line_penalty = float(width) ** 2
+    best = [0.0] + [math.inf] * n  # best[j] = the cost of the best layout of words[:j]
+    breaks = [0] * (n + 1)  # breaks[j] = the start of the last line in that layout
+
+    for j in range(1, n + 1):
+        for i in range(j - 1, -1, -1):
+            line_width = (advance[j] - advance[i]) + (joins[j - 1] - joins[i])
+
+            if line_width > width and i < j - 1:
+                # adding any more words to the front of this line will only make it longer
+                break
+
+            cost = best[i] + max(width - line_width, 0.0) ** 2 + line_penalty
+            if cost < best[j]:
+                best[j], breaks[j] = cost, i
+
+    lines: list[list[str]] = []
+    j = n
+    while j > 0:
+        lines.append(words[breaks[j]:j])
+        j = breaks[j]
+
+    return lines[::-1]
+
+
+def break_lines(words: list[str], measure: TextMeasurer, width: float,
+                line_breaking: LineBreaking = LineBreaking.GREEDY) -> list[list[str]]:
+    if line_breaking is LineBreaking.BALANCED:
+        return balanced_breaks(words, measure, width)
+
+    return greedy_breaks(words, measure, width)
+
+
+def wrap_text(text: str, font: ImageFont.ImageFont | ImageFont.FreeTypeFont, width: int, *,
+              ligatures: bool = True, line_breaking: LineBreaking = LineBreaking.GREEDY) -> str:
     """Define the wrap boundaries to keep the text within the given width box."""
-    im = transparent_image(2 * width, width)
-    lines: list[str] = [""]
-    draw = ImageDraw.Draw(im)
+    measure = text_measurer(font, ligatures)
+    lines = break_lines(text.split(), measure, width, line_breaking)
+
+    return "\n".join(" ".join(line) for line in lines)
+
+
+def fit_font(text: str, font: ImageFont.FreeTypeFont, width: int, height: int, *, ligatures: bool = True,
+             line_breaking: LineBreaking = LineBreaking.GREEDY, min_size: int = 6) -> ImageFont.FreeTypeFont:
+    """Find the largest size (no larger than the font's current size) at which the wrapped text fits in the box.
+
+    The sizes are binary searched, loading each one through the font cache and measuring with its cached measurer,
+    so fitting many segments against the same font stays cheap. If even min_size doesn't fit, that is used anyway.
+    """
+    path = Path(font.path)
+    words = text.split()
 
-    for word in text.split():
-        current = lines[-1]
-        extended = f"{current} {word}"
+    def fits(size: int) -> bool:
+        measure = text_measurer(load_font(path, size, font.layout_engine), ligatures)
+        lines = break_lines(words, measure, width, line_breaking)
+        return measure.block_height(len(lines)) <= height and \
+            all(measure.line_width(line) <= width for line in lines)
 
-        if draw.textlength(extended, font=font) <= width:
-            # It will fit, so put it on this line.
-            lines[-1] = extended
+    low, high = min_size, int(font.size)
+    if fits(high):
+        return font
+
+    # invariant: high doesn't fit; low fits (or is min_size)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if fits(middle):
+            low = middle
         else:
-            # It won't fit, so add it to the next line.
-            lines.append(word)
+            high = middle
 
-    return "\n".join(lines)
+    return load_font(path, low, font.layout_engine)
 
 
 def transparent_image(width: int, height: int) -> Image.Image:
@@ -52,12 +299,111 @@ def transparent_image(width: int, height: int) -> Image.Image:
     return Image.new("RGBA", (width, height), (255, 255, 255, 0))
 
 
+def image_digest(image: Image.Image) -> bytes:
+    """Return a digest of the image's pixel data, so that identical images can be detected."""
+    return hashlib.blake2b(image.tobytes(), digest_size=16).digest()
+
+
+# bump this whenever a change to the drawing code alters how text is rendered, so that cached sprites drawn by the
+# old code are no longer used
+RENDER_VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def renderer_version() -> tuple[int, str, bool]:
+    """Identify the renderer (the drawing code, the Pillow version and whether raqm is available), for cache keys."""
+    return RENDER_VERSION, PIL.__version__, bool(features.check_feature("raqm"))
+
+
+class SpriteCache:
+    """A content-addressed, on-disk store of rendered images.
+
+    Keys should be digests of everything that determines the image (see `cache_key`), so entries never need
+    invalidating: changing any input simply produces a different key. The entries left behind are dropped by `prune`,
+    least recently used first, once the cache grows past max_bytes.
+    """
+
+    def __init__(self, directory: Path | None = None, *, max_bytes: int = 256 * 2 ** 20) -> None:
+        self.directory = directory if directory is not None else user_cache_dir() / "sprites"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.png"
+
+    def get(self, key: str) -> Image.Image | None:
+        path = self._path(key)
+
+        try:
+            with Image.open(path) as image:
+                sprite = image.convert("RGBA")
+        except (OSError, ValueError):
+            return None
+
+        # the modification time doubles as the last use, which is what prune goes by
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return sprite
+
+    def put(self, key: str, image: Image.Image) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+
+        # write then rename, so that concurrent renderers never see a partial file
+        temp = path.with_suffix(f".{os.getpid()}.tmp")
+        image.save(temp, format="PNG")
+        temp.replace(path)
+
+    def prune(self) -> int:
+        """Delete the least recently used entries until the cache fits within max_bytes, returning how many went."""
+        entries = []
+        for path in self.directory.glob("*/*.png"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+
+        if removed:
+            logger.debug(f"Pruned {removed} sprites from the render cache.")
+
+        return removed
+
+
+def cache_key(*parts: object) -> str:
+    """Digest the given (JSON-serialisable, or at least str-able) values into a cache key."""
+    payload = json.dumps(parts, default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def render_text(image: Image.Image, text: str, font: ImageFont.ImageFont | ImageFont.FreeTypeFont, pos: tuple[int, int],
-                width: int, align: TextAlignment) -> Image.Image:
-    """Render the text onto the image."""
+                width: int, align: TextAlignment, *, ligatures: bool = True,
+                line_breaking: LineBreaking = LineBreaking.GREEDY, fit_height: int | None = None) -> Image.Image:
+    """Render the text onto the image.
+
+    If fit_height is given, the font is shrunk as necessary for the wrapped text to fit within width x fit_height.
+    """
+    if fit_height is not None and isinstance(font, ImageFont.FreeTypeFont):
+        font = fit_font(text, font, width, fit_height, ligatures=ligatures, line_breaking=line_breaking)
+
     draw = ImageDraw.Draw(image)
-    text = wrap_text(text=text, font=font, width=width)
+    text = wrap_text(text=text, font=font, width=width, ligatures=ligatures, line_breaking=line_breaking)
+    features = font_features(font, ligatures)
 
-    draw.multiline_text(pos, text, font=font, align=align.value, fill="black")
+    draw.multiline_text(pos, text, font=font, align=align.value, fill="black", features=features)
 
     return image
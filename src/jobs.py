@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Callable
+
+from loguru import logger
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been asked to stop."""
+
+
+class JobControl:
+    """Shared between a long-running job and whoever started it, so that the job can be stopped part-way through.
+
+    The job calls checkpoint() wherever it is safe to stop; anyone else can call cancel() at any time.
+    The job also reports its progress through each stage, which is logged (with throughput and ETA) every
+    log_interval seconds and passed on to any listeners as (stage, fraction complete).
+    """
+
+    def __init__(self, *, log_interval: float = 5.0) -> None:
+        self._cancelled = threading.Event()
+        self.log_interval = log_interval
+        self.listeners: list[Callable[[str, float], None]] = []
+
+        # stage -> (start time, time last logged)
+        self._stages: dict[str, tuple[float, float]] = {}
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def reset(self) -> None:
+        """Clear any cancellation and progress, ready for the next job."""
+        self._cancelled.clear()
+        self._stages.clear()
+
+    def checkpoint(self) -> None:
+        """Stop the job (by raising JobCancelled) if it has been cancelled."""
+        if self.cancelled:
+            raise JobCancelled
+
+    def progress(self, stage: str, done: float, total: float, *, unit: str = "frames") -> None:
+        """Report that `done` of the `total` units of work in the given stage are complete."""
+        now = time.monotonic()
+        start, last_logged = self._stages.setdefault(stage, (now, -math.inf))
+        fraction = min(done / total, 1.0) if total > 0 else 1.0
+
+        for listener in self.listeners:
+            listener(stage, fraction)
+
+        if now - last_logged < self.log_interval and fraction < 1.0:
+            return
+
+        self._stages[stage] = start, now
+        elapsed = now - start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = f"{(total - done) / rate:.0f}s" if rate > 0 else "?"
+        logger.info(f"{stage}: {done:.0f}/{total:.0f} {unit} ({fraction:.0%}) | {rate:.1f} {unit}/s | ETA {eta}")
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+
+class Cue(NamedTuple):
+    start: float
+    end: float
+    text: str
+
+
+SRT_TIMESTAMP = re.compile(r"(\d+):(\d{2}):(\d{2})[,.](\d{3})")
+
+
+def parse_srt_timestamp(s: str, /) -> float:
+    """Convert an SRT timestamp (HH:MM:SS,fff) to seconds."""
+    if not (match := SRT_TIMESTAMP.fullmatch(s.strip())):
+        raise ValueError(f"invalid SRT timestamp: {s!r}")
+
+    hours, minutes, seconds, millis = map(int, match.groups())
+    return 3600 * hours + 60 * minutes + seconds + millis / 1000
+
+
+def read_srt(path: Path) -> list[Cue]:
+    """Read the cues from an SRT file. Multi-line cue text is joined into a single line."""
+    cues: list[Cue] = []
+    blocks = re.split(r"\n\s*\n", path.read_text(encoding="utf-8-sig").replace("\r\n", "\n").strip())
+
+    for block in blocks:
+        lines = block.splitlines()
+
+        # the index line is optional in practice, so find the timing line instead
+        timing = next((i for i, line in enumerate(lines) if "-->" in line), None)
+        if timing is None:
+            continue
+
+        start, end = lines[timing].split("-->")
+        text = " ".join(line.strip() for line in lines[timing + 1:] if line.strip())
+        cues.append(Cue(parse_srt_timestamp(start), parse_srt_timestamp(end.split()[0]), text))
+
+    return cues
+
+
+class AssStyle(NamedTuple):
+    fontname: str
+    fontsize: int
+    alignment: int = 8  # numpad position: 7/8/9 are top-left/centre/right
+    margin_l: int = 0
+    margin_r: int = 0
+    margin_v: int = 0
+    colour: str = "&H00000000"  # &HAABBGGRR, so opaque black
+    bold: bool = False
+    italic: bool = False
+
+
+def ass_timestamp(seconds: float, /) -> str:
+    """Convert seconds to an ASS timestamp (H:MM:SS.cc)."""
+    centiseconds = round(seconds * 100)
+    minutes, centiseconds = divmod(centiseconds, 60 * 100)
+    hours, minutes = divmod(minutes, 60)
+
+    return f"{hours:d}:{minutes:02d}:{centiseconds / 100:05.2f}"
+
+
+def escape_ass(text: str, /) -> str:
+    """Escape text so that libass shows it literally, rather than reading braces as override tags.
+
+    A backslash can't itself be escaped, so a word joiner is put after each one to stop it forming an escape like \\N.
+    """
+    return text.replace("\\", "\\\u2060").replace("{", "\\{").replace("}", "\\}")
+
+
+def write_ass(cues: Iterable[Cue], dest: Path, style: AssStyle, play_res: tuple[int, int], *,
+              wrap_style: int = 0) -> Path:
+    """Write the cues as an Advanced SubStation Alpha script, all in a single style.
+    http://www.tcax.org/docs/ass-specs.htm
+    """
+    width, height = play_res
+    header = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        f"WrapStyle: {wrap_style}",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+        "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, "
+        "MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,{style.fontname},{style.fontsize},{style.colour},{style.colour},&H00000000,&H00000000,"
+        f"{-int(style.bold)},{-int(style.italic)},0,0,100,100,0,0,1,0,0,"
+        f"{style.alignment},{style.margin_l},{style.margin_r},{style.margin_v},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+
+    with open(dest, "w", encoding="utf-8") as f:
+        f.write("\n".join(header) + "\n")
+
+        for cue in cues:
+            text = escape_ass(cue.text).replace("\n", r"\N")
+            f.write(f"Dialogue: 0,{ass_timestamp(cue.start)},{ass_timestamp(cue.end)},Default,,0,0,0,,{text}\n")
+
+    return dest
+
+
+def vtt_timestamp(seconds: float, /) -> str:
+    """Convert seconds to a WebVTT timestamp (HH:MM:SS.mmm)."""
+    milliseconds = round(seconds * 1000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+def escape_vtt(text: str, /) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def write_vtt(cues: Iterable[Cue], dest: Path, *, settings: str = "") -> Path:
+    """Write the cues as WebVTT, applying the same cue settings (e.g. "align:center line:80%") to each.
+    https://www.w3.org/TR/webvtt1/
+
+    Cues are written as they are read from the iterable, so a generator can be exported in constant memory.
+    """
+    suffix = f" {settings}" if settings else ""
+
+    with open(dest, "w", encoding="utf-8") as f:
+        f.write("WEBVTT\n")
+
+        for cue in cues:
+            f.write(f"\n{vtt_timestamp(cue.start)} --> {vtt_timestamp(cue.end)}{suffix}\n{escape_vtt(cue.text)}\n")
+
+    return dest
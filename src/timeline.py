@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from fractions import Fraction
+from typing import Hashable, Iterable, NamedTuple, Sequence
+
+Time = Fraction | float | int
+
+
+def as_fraction(value: Time) -> Fraction:
+    """Convert a time (in seconds) or framerate to an exact fraction.
+
+    Floats are converted via their shortest decimal representation, so 1.1 becomes 11/10 rather than
+    the nearest binary fraction.
+    """
+    if isinstance(value, float):
+        return Fraction(str(value))
+
+    return Fraction(value)
+
+
+def time_to_frame(seconds: Time, fps: Time) -> int:
+    """Return the index of the frame nearest the given time, with exact arithmetic (and ties rounding up)."""
+    position = as_fraction(seconds) * as_fraction(fps)
+    return int(position + Fraction(1, 2)) if position >= 0 else 0
+
+
+def frame_to_time(frame: int, fps: Time) -> Fraction:
+    """Return the exact time (in seconds) at which the given frame starts."""
+    return frame / as_fraction(fps)
+
+
+class Run(NamedTuple):
+    """A stretch of consecutive frames [start, end) which all show the same image."""
+    start: int
+    end: int
+    key: int | None  # the index of the interval being shown, or None for a blank frame
+
+    @property
+    def frames(self) -> int:
+        return self.end - self.start
+
+    def duration(self, fps: Time) -> Fraction:
+        """Return the exact length (in seconds) of this run."""
+        return self.frames / as_fraction(fps)
+
+
+def schedule(intervals: Iterable[tuple[Time, Time]], fps: Time, *, duration: Time | None = None) -> list[Run]:
+    """Lay the given (start, end) intervals out on the frame grid as a run-length schedule.
+
+    The resulting runs are contiguous from frame 0, never overlap, and are never empty. Gaps are filled with
+    blank runs (key=None), including out to the given total duration, if there is one. An interval which overlaps
+    its predecessor is clipped to start where that one ends.
+
+    >>> schedule([(0.5, 1.0), (1.0, 2.0)], fps=10)
+    [Run(start=0, end=5, key=None), Run(start=5, end=10, key=0), Run(start=10, end=20, key=1)]
+    """
+    runs: list[Run] = []
+    frame = 0
+
+    for key, (start, end) in enumerate(intervals):
+        start_frame = max(frame, time_to_frame(start, fps))
+        end_frame = max(start_frame, time_to_frame(end, fps))
+
+        if start_frame > frame:
+            runs.append(Run(frame, start_frame, None))
+
+        if end_frame > start_frame:
+            runs.append(Run(start_frame, end_frame, key))
+
+        frame = end_frame
+
+    if duration is not None and (last_frame := time_to_frame(duration, fps)) > frame:
+        runs.append(Run(frame, last_frame, None))
+
+    return runs
+
+
+_MISSING = object()
+
+
+def _label_at(frame: int, runs: Sequence[Run], labels: Sequence[Hashable], starts: Sequence[int]) -> Hashable:
+    i = bisect_right(starts, frame) - 1
+    if i < 0 or frame >= runs[i].end:
+        return _MISSING
+
+    return labels[i]
+
+
+def changed_ranges(old: Sequence[Run], old_labels: Sequence[Hashable],
+                   new: Sequence[Run], new_labels: Sequence[Hashable]) -> list[tuple[int, int]]:
+    """Compare two schedules, returning the frame ranges [start, end) which show something different.
+
+    Each run is compared by its label (for instance, the text it shows) rather than its key, since keys are just
+    positions and shift whenever a segment is added or removed. Frames present in only one schedule count as changed.
+    """
+    old_starts = [run.start for run in old]
+    new_starts = [run.start for run in new]
+    boundaries = sorted({run.start for run in old} | {run.end for run in old} |
+                        {run.start for run in new} | {run.end for run in new})
+
+    ranges: list[tuple[int, int]] = []
+
+    for a, b in zip(boundaries, boundaries[1:]):
+        before = _label_at(a, old, old_labels, old_starts)
+        after = _label_at(a, new, new_labels, new_starts)
+
+        if before != after:
+            if ranges and ranges[-1][1] == a:
+                ranges[-1] = (ranges[-1][0], b)
+            else:
+                ranges.append((a, b))
+
+    return ranges
+
+
+def clip_runs(runs: Iterable[Run], start: int, end: int) -> list[Run]:
+    """Return the parts of the runs which fall within the frames [start, end)."""
+    return [Run(max(run.start, start), min(run.end, end), run.key)
+            for run in runs if run.start < end and start < run.end]
+
+
+def split_at_gaps(runs: Sequence[Run], chunks: int) -> list[list[Run]]:
+    """Split a schedule into (at most) the given number of roughly equal chunks of consecutive runs.
+
+    Chunks only ever start at a blank run, so no segment is divided between two chunks.
+    """
+    if not runs:
+        return []
+
+    target = (runs[-1].end - runs[0].start) / max(chunks, 1)
+    groups: list[list[Run]] = [[]]
+
+    for run in runs:
+        current = groups[-1]
+        if run.key is None and current and len(groups) < chunks and run.start - current[0].start >= target:
+            groups.append([])
+
+        groups[-1].append(run)
+
+    return groups
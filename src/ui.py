@@ -1,12 +1,18 @@
 from __future__ import annotations
 
 import logging
+import queue
+import threading
 import tkinter as tk
+from concurrent.futures import Future
 from enum import Enum
 from tkinter.filedialog import askopenfilename
 from typing import Any, Callable, Generic, Iterable, TypeVar
 
 import ttkbootstrap as ttkb  # type: ignore
+from loguru import logger
+
+from src.jobs import JobCancelled, JobControl
 
 T = TypeVar("T")
 
@@ -104,6 +110,11 @@ class CCombobox(ttkb.Combobox, Generic[T]):
     def value(self, val: T) -> None:
         self._var.set(str(val))
 
+    def set_options(self, options: Iterable[Any]) -> None:
+        """Replace the options in the dropdown, keeping whatever is currently entered."""
+        self.options = tuple(str(x) for x in options)
+        self.configure(values=self.options)
+
 
 class CSwitch(ttkb.Checkbutton):
     def __init__(self, master: Any, *args: Any, **kwargs: Any) -> None:
@@ -195,3 +206,75 @@ class CTextLogHandler(logging.Handler):
 
         # required since we can't modify the sink from other threads
         self.sink.after(ms=0, func=append_to_log)
+
+
+class JobRunner:
+    """Run one job at a time on a worker thread, so that the Tk event loop stays responsive.
+
+    Tk must only be touched from the main thread, so the job hands anything involving widgets (dialogs, progress
+    meters, ...) to call_in_main, which queues it for the main thread (polled with after()) and waits for the result.
+    """
+
+    def __init__(self, master: tk.Misc, *, poll_interval: int = 50) -> None:
+        self.master = master
+        self.poll_interval = poll_interval
+        self.job = JobControl()
+
+        self._calls: queue.SimpleQueue[tuple[Future, Callable[..., Any], tuple, dict]] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+
+        self.master.after(self.poll_interval, self._poll)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> bool:
+        """Start running func(*args, **kwargs) on the worker thread, unless a job is already running."""
+        if self.running:
+            logger.warning("A job is already running.")
+            return False
+
+        self.job.reset()
+        self._thread = threading.Thread(target=self._run, args=(func, args, kwargs), daemon=True)
+        self._thread.start()
+        return True
+
+    def cancel(self) -> None:
+        """Ask the current job to stop at its next checkpoint."""
+        if self.running:
+            logger.info("Cancelling...")
+            self.job.cancel()
+
+    def call_in_main(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """From the worker thread, run func(*args, **kwargs) on the main thread and return its result."""
+        future: Future[T] = Future()
+        self._calls.put((future, func, args, kwargs))
+        return future.result()
+
+    def post(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        """From the worker thread, queue func(*args, **kwargs) to run on the main thread, without waiting for it."""
+        self._calls.put((Future(), func, args, kwargs))
+
+    def _run(self, func: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        try:
+            func(*args, **kwargs)
+        except JobCancelled:
+            logger.warning("Job cancelled.")
+        except Exception:
+            logger.exception("Job failed.")
+
+    def _poll(self) -> None:
+        # reschedule first, since a call may open a modal dialog and run a nested event loop
+        self.master.after(self.poll_interval, self._poll)
+
+        while True:
+            try:
+                future, func, args, kwargs = self._calls.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+from collections import deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
 from difflib import SequenceMatcher
 from itertools import count, tee
+import os
 from pathlib import Path
 import re
-from typing import Callable, Iterable, Iterator, Sequence, TypeVar
+import shutil
+import sys
+import tempfile
+from typing import Any, Callable, Iterable, Iterator, Sequence, TypeVar
+
+from src.jobs import JobCancelled
 
 T = TypeVar("T")
+R = TypeVar("R")
 
 
 def diff_blocks(
@@ -77,6 +87,63 @@ def truncate_path(path: Path, highest_parent: str) -> Path:
     raise ValueError(f"cannot truncate {path} to {highest_parent}")
 
 
+def user_cache_dir() -> Path:
+    """Return (creating it if necessary) the directory in which data is cached between runs."""
+    if sys.platform == "win32":
+        base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local"))
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+
+    cache_dir = base / "stlrapps"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def link_or_copy(src: Path, dest: Path) -> None:
+    """Hardlink dest to src, falling back to a full copy where hardlinks aren't supported."""
+    try:
+        dest.hardlink_to(src)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+@contextmanager
+def work_directory(root: Path | None = None, *, prefix: str = "job-") -> Iterator[Path]:
+    """Create a fresh directory (under root, or else the system's temporary directory) for one job's working files.
+
+    The directory is removed once the job finishes successfully or is cancelled, but kept if it fails, so it can be
+    inspected.
+    """
+    if root is not None:
+        root.mkdir(parents=True, exist_ok=True)
+
+    directory = Path(tempfile.mkdtemp(prefix=prefix, dir=root))
+
+    try:
+        yield directory
+    except JobCancelled:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def bounded_map(executor: Executor, fn: Callable[..., R], *iterables: Iterable[Any], window: int) -> Iterator[R]:
+    """Like executor.map, but only keep up to `window` tasks in flight, so results can't pile up in memory."""
+    pending: deque[Future[R]] = deque()
+
+    for args in zip(*iterables):
+        pending.append(executor.submit(fn, *args))
+
+        if len(pending) >= window:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
 def pairwise(s: Iterable[T]) -> Iterator[tuple[T, T]]:
     """s -> (s0, s1), (s1, s2), (s2, s3), ..."""
     a, b = tee(s)
@@ -0,0 +1,454 @@
+from __future__ import annotations
+
+import io
+import json
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from enum import Enum
+from fractions import Fraction
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable, NamedTuple, Sequence
+
+from PIL import Image
+
+from src.jobs import JobCancelled, JobControl
+
+ProgressCallback = Callable[[float], None]
+
+
+class FFmpegError(RuntimeError):
+    """Raised when an ffmpeg process exits unsuccessfully."""
+
+    def __init__(self, returncode: int, stderr: str) -> None:
+        self.returncode = returncode
+        self.stderr = stderr
+
+        lines = stderr.strip().splitlines()
+        super().__init__(f"ffmpeg exited with code {returncode}" + (f": {lines[-1]}" if lines else ""))
+
+    def __reduce__(self):
+        # so that it survives being passed back from a worker process
+        return type(self), (self.returncode, self.stderr)
+
+
+class Encoder(Enum):
+    """Encoder presets which keep the alpha channel, trading encode speed against file size."""
+    VP9_REALTIME = "vp9-realtime"  # fastest VP9; larger files
+    VP9_GOOD = "vp9-good"  # slower VP9; smaller files
+    PRORES_4444 = "prores-4444"  # near-lossless intermediate for editing; large files
+    QTRLE = "qtrle"  # lossless QuickTime Animation; very large files, but cheap to encode
+
+    @property
+    def suffix(self) -> str:
+        return ".webm" if self in (Encoder.VP9_REALTIME, Encoder.VP9_GOOD) else ".mov"
+
+    def args(self, threads: int = 0) -> tuple[str, ...]:
+        """The ffmpeg output arguments for this preset. VP9 uses the given number of threads (0 for automatic)."""
+        if self is Encoder.VP9_REALTIME:
+            return ("-c:v", "libvpx-vp9", "-row-mt", "1", "-threads", str(threads),
+                    "-deadline", "realtime", "-cpu-used", "8", "-pix_fmt", "yuva420p")
+
+        if self is Encoder.VP9_GOOD:
+            return ("-c:v", "libvpx-vp9", "-row-mt", "1", "-threads", str(threads),
+                    "-deadline", "good", "-cpu-used", "2", "-pix_fmt", "yuva420p")
+
+        if self is Encoder.PRORES_4444:
+            return "-c:v", "prores_ks", "-profile:v", "4444", "-pix_fmt", "yuva444p10le"
+
+        return "-c:v", "qtrle", "-pix_fmt", "argb"
+
+
+class BurnInEncoder(Enum):
+    """Encoder presets for video with the subtitles burned in, which is for delivery and so needs no alpha channel."""
+    H264 = "h264"  # plays almost everywhere
+    H265 = "h265"  # smaller files, but slower to encode and less widely supported
+    VP9 = "vp9"  # for WebM
+
+    @property
+    def containers(self) -> tuple[str, ...]:
+        """The file extensions this codec can be written to, the first being the default."""
+        if self is BurnInEncoder.VP9:
+            return ".webm", ".mkv"
+
+        if self is BurnInEncoder.H265:
+            return ".mp4", ".mkv", ".mov", ".m4v"
+
+        return ".mp4", ".mkv", ".mov", ".m4v", ".avi"
+
+    def suffix(self, source_suffix: str) -> str:
+        """Keep the source's container if this codec can go in it, or else use the default one."""
+        return source_suffix if source_suffix.lower() in self.containers else self.containers[0]
+
+    def args(self, threads: int = 0) -> tuple[str, ...]:
+        """The ffmpeg output arguments for this preset: visually lossless quality, at a moderate encode speed."""
+        if self is BurnInEncoder.H264:
+            return "-c:v", "libx264", "-preset", "medium", "-crf", "18", "-threads", str(threads), "-pix_fmt", "yuv420p"
+
+        if self is BurnInEncoder.H265:
+            return "-c:v", "libx265", "-preset", "medium", "-crf", "22", "-pix_fmt", "yuv420p"
+
+        return ("-c:v", "libvpx-vp9", "-crf", "24", "-b:v", "0", "-row-mt", "1", "-threads", str(threads),
+                "-deadline", "good", "-cpu-used", "2", "-pix_fmt", "yuv420p")
+
+
+class MediaInfo(NamedTuple):
+    path: Path
+    width: int | None
+    height: int | None
+    fps: Fraction | None
+    duration: float | None
+
+    @property
+    def size(self) -> tuple[int, int] | None:
+        if self.width is None or self.height is None:
+            return None
+
+        return self.width, self.height
+
+
+def _parse_rate(rate: str | None) -> Fraction | None:
+    if not rate or rate.endswith("/0"):
+        return None
+
+    return Fraction(rate) or None
+
+
+def probe_media(path: Path) -> MediaInfo:
+    """
+    Read the resolution, exact frame rate, and duration of the given media file.
+    ffprobe -v error -select_streams V:0 -show_entries stream=width,height,r_frame_rate,avg_frame_rate:format=duration
+        -of json file
+
+    Audio-only files have no resolution or frame rate, so those are None. Cover art doesn't count as video (V rather
+    than v skips attached pictures). If the average frame rate differs noticeably from the base rate, the video has
+    a variable frame rate, and the average is the better grid to render on.
+    """
+    command = (
+        "ffprobe", "-v", "error", "-select_streams", "V:0",
+        "-show_entries", "stream=width,height,r_frame_rate,avg_frame_rate:format=duration", "-of", "json", str(path)
+    )
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    data = json.loads(result.stdout)
+
+    streams = data.get("streams") or [{}]
+    stream = streams[0]
+    rate = _parse_rate(stream.get("r_frame_rate"))
+    average = _parse_rate(stream.get("avg_frame_rate"))
+    duration = data.get("format", {}).get("duration")
+
+    if average is not None and (rate is None or abs(average - rate) > rate / 100):
+        rate = average
+
+    return MediaInfo(
+        path=path,
+        width=stream.get("width"),
+        height=stream.get("height"),
+        fps=rate,
+        duration=float(duration) if duration is not None else None
+    )
+
+
+def _drain(stream: IO[str]) -> tuple[deque[str], threading.Thread]:
+    """Read the stream to the end in the background (so its pipe can never fill up), keeping just the last lines."""
+    lines: deque[str] = deque(maxlen=50)
+    reader = threading.Thread(target=lines.extend, args=(stream,), daemon=True)
+    reader.start()
+
+    return lines, reader
+
+
+def run_ffmpeg(command: Sequence[str], on_progress: ProgressCallback | None = None, *, job: JobControl | None = None,
+               dest: Path | None = None) -> None:
+    """
+    Run an ffmpeg command, raising FFmpegError (with the tail of its stderr) if it fails.
+    ffmpeg -progress pipe:1 -nostats ...
+
+    If on_progress is given, it is called with the output timestamp (in seconds) each time ffmpeg reports progress.
+    If the job is cancelled meanwhile, ffmpeg is stopped, its partial output (dest) removed, and JobCancelled raised.
+    """
+    program, *args = command
+    process = subprocess.Popen((program, "-progress", "pipe:1", "-nostats", *args), stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    assert process.stdout is not None and process.stderr is not None
+    stderr, reader = _drain(process.stderr)
+
+    for line in process.stdout:
+        if job is not None and job.cancelled:
+            process.terminate()
+            break
+
+        key, _, value = line.strip().partition("=")
+        if key == "out_time_us" and on_progress is not None and value.lstrip("-").isdigit():
+            on_progress(max(int(value), 0) / 1_000_000)
+
+    process.wait()
+    reader.join()
+
+    if job is not None and job.cancelled:
+        if dest is not None:
+            dest.unlink(missing_ok=True)
+
+        raise JobCancelled
+
+    if process.returncode != 0:
+        raise FFmpegError(process.returncode, "".join(stderr))
+
+
+def pad_filter(canvas: tuple[int, int], offset: tuple[int, int]) -> tuple[str, ...]:
+    """Build the ffmpeg arguments to place a smaller (sprite) video at the given offset on a transparent canvas."""
+    (width, height), (x, y) = canvas, offset
+    return "-vf", f"pad={width}:{height}:{x}:{y}:color=black@0.0"
+
+
+def images_to_video(image_template: str, fps: Fraction | float, *, dest: Path, canvas: tuple[int, int] | None = None,
+                    offset: tuple[int, int] = (0, 0), variable_frame_rate: bool = False,
+                    encoder: Encoder = Encoder.VP9_GOOD, threads: int = 0, frames: int | None = None,
+                    on_progress: ProgressCallback | None = None, job: JobControl | None = None) -> Path:
+    """
+    Convert a sequence of images to a video file, raising FFmpegError if ffmpeg fails.
+    https://video.stackexchange.com/a/33011
+    ffmpeg -i anim.%04d.png -r 30 -c:v libvpx-vp9 ... -pix_fmt yuva420p video.webm
+
+    If given a concat script (*.ffconcat), the images and their durations are read from that instead.
+    ffmpeg -f concat -safe 0 -i frames.ffconcat -r 30 -frames:v 900 -pix_fmt yuva420p video.webm
+
+    At a constant frame rate, ffmpeg pads the end of a concat script's timeline out by a few frames, so pass the
+    schedule's exact length as `frames` to cut the output off there.
+
+    If a canvas size is given, the images are treated as sprites and padded out to it, placed at the given offset.
+
+    With variable_frame_rate, frames are only written when the image changes (keeping the concat script's timestamps),
+    rather than being duplicated out to a constant frame rate.
+    ffmpeg -f concat -safe 0 -i frames.ffconcat -fps_mode vfr -pix_fmt yuva420p video.webm
+
+    The encoder preset decides the codec (and so which container dest should be: see Encoder.suffix).
+
+    >>> images_to_video("anim.%04d.png", fps=30, dest=Path("video.webm"))
+    ...
+    """
+    source = ("-f", "concat", "-safe", "0", "-i", image_template) if image_template.endswith(".ffconcat") \
+        else ("-i", image_template)
+    placement = pad_filter(canvas, offset) if canvas is not None else ()
+    rate = ("-fps_mode", "vfr") if variable_frame_rate else ("-r", str(fps))
+    length = ("-frames:v", str(frames)) if frames is not None and not variable_frame_rate else ()
+    command = ("ffmpeg", "-y", *source, *placement, *rate, *length, *encoder.args(threads), str(dest))
+    run_ffmpeg(command, on_progress, job=job, dest=dest)
+
+    return dest
+
+
+def images_to_video_async(executor: Executor, image_template: str, fps: Fraction | float, *, dest: Path,
+                          **kwargs: Any) -> Future[Path]:
+    """Start images_to_video on the given executor. The future's result is the video, or raises FFmpegError."""
+    return executor.submit(images_to_video, image_template, fps, dest=dest, **kwargs)
+
+
+def concat_videos(parts: list[Path], dest: Path, *, job: JobControl | None = None) -> Path:
+    """
+    Losslessly join videos with identical encoding parameters, end to end.
+    ffmpeg -f concat -safe 0 -i parts.ffconcat -c copy video.webm
+
+    The listing is written beside the parts rather than the output, and removed once the join is done.
+    """
+    listing = parts[0].parent / f"{dest.stem}.parts.ffconcat"
+    lines = ["ffconcat version 1.0", *(f"file '{part.resolve().as_posix()}'" for part in parts)]
+    listing.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    command = ("ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", str(listing), "-c", "copy", str(dest))
+    run_ffmpeg(command, job=job, dest=dest)
+    listing.unlink()
+
+    return dest
+
+
+class Chunk(NamedTuple):
+    """A concat script covering a stretch of the timeline, exactly how many frames that stretch is, and the video file
+    (part) to encode it to."""
+    script: Path
+    frames: int
+    part: Path
+
+
+def encode_parts(chunks: Iterable[Chunk], fps: Fraction | float, *, workers: int,
+                 canvas: tuple[int, int] | None = None, offset: tuple[int, int] = (0, 0),
+                 encoder: Encoder = Encoder.VP9_GOOD, threads: int = 0,
+                 on_progress: ProgressCallback | None = None, job: JobControl | None = None) -> list[Path]:
+    """Encode each chunk to its part, with up to `workers` ffmpeg processes at once, returning the parts.
+
+    Each part is cut off at exactly its chunk's frame count (ffmpeg would otherwise pad out the end of each script),
+    so the parts join without any drift. Chunks are submitted as soon as they are read from the iterable, so a
+    generator can keep rendering later chunks while the earlier ones encode. If any part fails, the rest are abandoned
+    and its FFmpegError is raised. Progress is reported as the total time encoded across all the parts.
+    """
+    parts: list[Path] = []
+    futures: list[Future[Path]] = []
+    encoded: dict[int, float] = {}
+    lock = threading.Lock()
+
+    def reporter(i: int) -> ProgressCallback:
+        def report(seconds: float) -> None:
+            with lock:
+                encoded[i] = seconds
+                total = sum(encoded.values())
+
+            if on_progress is not None:
+                on_progress(total)
+
+        return report
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for i, chunk in enumerate(chunks):
+                parts.append(chunk.part)
+                futures.append(images_to_video_async(executor, str(chunk.script), fps=fps, dest=chunk.part,
+                                                     canvas=canvas, offset=offset, encoder=encoder, threads=threads,
+                                                     frames=chunk.frames, on_progress=reporter(i), job=job))
+
+            for future in futures:
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return parts
+
+
+def encode_in_chunks(chunks: Iterable[Chunk], fps: Fraction | float, dest: Path, *, workers: int,
+                     job: JobControl | None = None, **kwargs: Any) -> Path:
+    """Encode the chunks as separate parts (see encode_parts), then join them losslessly into dest.
+
+    The parts are left where they are, so that any of them can later be re-encoded and joined back up with the rest.
+    """
+    parts = encode_parts(chunks, fps, workers=workers, job=job, **kwargs)
+    return concat_videos(parts, dest, job=job)
+
+
+def write_concat_script(entries: Iterable[tuple[Path, Fraction]], dest: Path, *,
+                        framerate: Fraction | float | None = None) -> Path:
+    """
+    Write an ffmpeg concat script showing each image for the given duration (in seconds).
+    https://trac.ffmpeg.org/wiki/Slideshow
+
+    Image paths are written relative to the script's directory where possible. Durations are rounded against the
+    running total rather than individually, so rounding never accumulates into drift.
+
+    Each image is otherwise read with a 25 fps time base, which rounds its timestamps to 40 ms steps, so pass the
+    video's framerate to have them land exactly on its frame boundaries.
+    """
+    option = [f"option framerate {framerate}"] if framerate is not None else []
+    lines = ["ffconcat version 1.0"]
+    last: Path | None = None
+    elapsed = Fraction(0)
+
+    for path, duration in entries:
+        name = path.relative_to(dest.parent) if path.is_relative_to(dest.parent) else path.resolve()
+        written = round(elapsed + duration, 6) - round(elapsed, 6)
+        elapsed += duration
+
+        lines.append(f"file '{name.as_posix()}'")
+        lines.extend(option)
+        lines.append(f"duration {float(written):.6f}")
+        last = name
+
+    if last is not None:
+        # the final duration is ignored unless the last file is listed again
+        lines.append(f"file '{last.as_posix()}'")
+        lines.extend(option)
+
+    dest.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return dest
+
+
+def burn_in(media: Path, sprite_script: Path, offset: tuple[int, int], dest: Path, *,
+            encoder: BurnInEncoder = BurnInEncoder.H264, threads: int = 0, on_progress: ProgressCallback | None = None,
+            job: JobControl | None = None) -> Path:
+    """
+    Composite a timed sprite track (an ffconcat script) over the source video in a single decode/encode pass.
+    ffmpeg -i video.mp4 -f concat -safe 0 -i frames.ffconcat
+        -filter_complex "[0:v][1:v]overlay=x=X:y=Y:eof_action=pass[v]" -map "[v]" -map 0:a? -c:a copy
+        -c:v libx264 -crf 18 ... out.mp4
+
+    The encoder preset decides the codec, so dest's container must be able to hold it (see BurnInEncoder.suffix).
+
+    The sprite track carries its own timestamps, so a single overlay filter does the work of a per-segment
+    overlay=...:enable='between(t,start,end)' chain without every segment's filter having to run on every frame.
+    """
+    x, y = offset
+    command = (
+        "ffmpeg", "-y", "-i", str(media), "-f", "concat", "-safe", "0", "-i", str(sprite_script),
+        "-filter_complex", f"[0:v][1:v]overlay=x={x}:y={y}:eof_action=pass[v]",
+        "-map", "[v]", "-map", "0:a?", "-c:a", "copy", *encoder.args(threads), str(dest)
+    )
+    run_ffmpeg(command, on_progress, job=job, dest=dest)
+
+    return dest
+
+
+def frames_to_video(frames: Iterable[Image.Image], size: tuple[int, int], fps: Fraction | float, dest: Path, *,
+                    canvas: tuple[int, int] | None = None, offset: tuple[int, int] = (0, 0),
+                    encoder: Encoder = Encoder.VP9_GOOD, threads: int = 0, job: JobControl | None = None) -> Path:
+    """
+    Pipe raw RGBA frames straight into ffmpeg, without writing any intermediate images. Raises FFmpegError on failure.
+    ffmpeg -f rawvideo -pix_fmt rgba -s 1920x1080 -r 30 -i - -c:v libvpx-vp9 ... -pix_fmt yuva420p video.webm
+
+    Each frame must be an RGBA image of the given size. Consecutive frames which are the same object are only
+    converted to bytes once, so repeating a single image for a long stretch of the video is cheap.
+
+    If a canvas size is given, the frames are treated as sprites and padded out to it, placed at the given offset.
+
+    If the job is cancelled (or the frames stop coming for any other reason), ffmpeg is stopped and its partial output
+    removed, rather than being left to finish a truncated video.
+    """
+    width, height = size
+    placement = pad_filter(canvas, offset) if canvas is not None else ()
+    command = (
+        "ffmpeg", "-y",
+        "-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+        *placement, *encoder.args(threads), str(dest)
+    )
+
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    assert process.stdin is not None and process.stderr is not None
+    stderr, reader = _drain(io.TextIOWrapper(process.stderr, errors="replace"))
+
+    previous: Image.Image | None = None
+    buffer = b""
+    failed = True
+
+    try:
+        for frame in frames:
+            if job is not None:
+                job.checkpoint()
+
+            if frame is not previous:
+                buffer = frame.tobytes()
+                previous = frame
+
+            process.stdin.write(buffer)
+
+        failed = False
+    except BrokenPipeError:
+        # ffmpeg has exited early, so its exit code and stderr (below) say why
+        failed = False
+    finally:
+        if failed:
+            process.kill()
+
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        process.wait()
+        reader.join()
+
+        if failed:
+            dest.unlink(missing_ok=True)
+
+    if process.returncode != 0:
+        raise FFmpegError(process.returncode, "".join(stderr))
+
+    return dest
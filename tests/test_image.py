@@ -0,0 +1,20 @@
+import os
+from pathlib import Path
+
+from src.image import SpriteCache, transparent_image
+
+
+def test_sprite_cache_prunes_least_recently_used_first(tmp_path: Path) -> None:
+    cache = SpriteCache(tmp_path)
+    for i, key in enumerate(["aa01", "bb02", "cc03"]):
+        cache.put(key, transparent_image(8, 8))
+        os.utime(cache._path(key), ns=(i * 10 ** 9, i * 10 ** 9))
+
+    # reading the oldest entry makes it the most recently used
+    assert cache.get("aa01") is not None
+
+    cache.max_bytes = 2 * cache._path("aa01").stat().st_size
+    assert cache.prune() == 1
+
+    assert cache.get("bb02") is None
+    assert cache.get("aa01") is not None and cache.get("cc03") is not None
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import pytest
+
+from src.subtitles import Cue, parse_srt_timestamp, read_srt
+from src.timeline import changed_ranges, schedule
+
+SRT = """\
+1
+00:00:00,500 --> 00:00:01,000
+one
+
+2
+00:00:01,500 --> 00:00:02,000
+two
+
+3
+00:00:02,500 --> 00:00:03,000
+three
+"""
+
+
+def _ranges(old: list[Cue], new: list[Cue], fps: int = 10) -> list[tuple[int, int]]:
+    old_runs = schedule([(cue.start, cue.end) for cue in old], fps=fps)
+    new_runs = schedule([(cue.start, cue.end) for cue in new], fps=fps)
+    return changed_ranges(old_runs, [None if run.key is None else old[run.key].text for run in old_runs],
+                          new_runs, [None if run.key is None else new[run.key].text for run in new_runs])
+
+
+def _edit(tmp_path: Path, old: str, new: str) -> list[tuple[int, int]]:
+    path = tmp_path / "edited.srt"
+    path.write_text(SRT.replace(old, new), encoding="utf-8")
+    return _ranges(read_srt(tmp_path / "original.srt"), read_srt(path))
+
+
+@pytest.fixture
+def original(tmp_path: Path) -> Path:
+    path = tmp_path / "original.srt"
+    path.write_text(SRT, encoding="utf-8")
+    return path
+
+
+def test_parse_srt_timestamp() -> None:
+    assert parse_srt_timestamp("01:02:03,456") == pytest.approx(3723.456)
+    assert parse_srt_timestamp(" 00:00:01.500 ") == 1.5
+
+    with pytest.raises(ValueError):
+        parse_srt_timestamp("00:01,500")
+
+
+def test_read_srt(original: Path) -> None:
+    assert read_srt(original) == [Cue(0.5, 1.0, "one"), Cue(1.5, 2.0, "two"), Cue(2.5, 3.0, "three")]
+
+
+def test_read_srt_tolerates_editor_quirks(tmp_path: Path) -> None:
+    # a byte order mark, Windows line endings, a missing index, cue settings and multi-line text
+    path = tmp_path / "quirky.srt"
+    text = "00:00:00,500 --> 00:00:01,000 X1:0\nfirst\nline\n\n2\n00:00:01,500 --> 00:00:02,000\nsecond\n"
+    path.write_bytes(b"\xef\xbb\xbf" + text.replace("\n", "\r\n").encode("utf-8"))
+
+    assert read_srt(path) == [Cue(0.5, 1.0, "first line"), Cue(1.5, 2.0, "second")]
+
+
+def test_text_edit_changes_only_that_cue(original: Path, tmp_path: Path) -> None:
+    assert _edit(tmp_path, "\ntwo\n", "\ntwo!\n") == [(15, 20)]
+
+
+def test_retime_changes_old_and_new_frames(original: Path, tmp_path: Path) -> None:
+    assert _edit(tmp_path, "00:00:01,500 --> 00:00:02,000", "00:00:01,200 --> 00:00:01,700") == [(12, 15), (17, 20)]
+
+
+def test_lengthened_schedule_changes_the_new_frames(original: Path, tmp_path: Path) -> None:
+    assert _edit(tmp_path, "00:00:02,500 --> 00:00:03,000", "00:00:02,500 --> 00:00:04,000") == [(30, 40)]
+
+
+def test_shortened_schedule_changes_the_dropped_frames(original: Path, tmp_path: Path) -> None:
+    assert _edit(tmp_path, "\n\n3\n00:00:02,500 --> 00:00:03,000\nthree\n", "\n") == [(20, 30)]
@@ -0,0 +1,82 @@
+from fractions import Fraction
+
+import pytest
+
+from src.timeline import Run, changed_ranges, clip_runs, schedule, split_at_gaps
+
+# eight one-second subtitles with half-second gaps, over a twelve-second video
+INTERVALS = [(0.5 + 1.5 * i, 1.5 + 1.5 * i) for i in range(8)]
+
+
+@pytest.mark.parametrize("fps", [Fraction(10), Fraction(30000, 1001)])
+@pytest.mark.parametrize("chunks", [1, 3, 8])
+def test_split_at_gaps_covers_schedule_exactly(fps: Fraction, chunks: int) -> None:
+    runs = schedule(INTERVALS, fps=fps, duration=12)
+    groups = split_at_gaps(runs, chunks)
+
+    assert 1 <= len(groups) <= chunks
+    assert [run for group in groups for run in group] == runs
+    assert sum(run.frames for group in groups for run in group) == runs[-1].end
+
+    for group in groups[1:]:
+        assert group[0].key is None
+
+
+def test_clip_runs_splits_runs_at_the_edges() -> None:
+    runs = [Run(0, 5, None), Run(5, 10, 0), Run(10, 20, 1)]
+
+    assert clip_runs(runs, 7, 12) == [Run(7, 10, 0), Run(10, 12, 1)]
+    assert clip_runs(runs, 0, 20) == runs
+    assert clip_runs(runs, 20, 25) == []
+
+
+def _changes(old: list[tuple[float, float, str]], new: list[tuple[float, float, str]], *,
+             duration: float | None = None) -> list[tuple[int, int]]:
+    old_runs = schedule([(start, end) for start, end, _ in old], fps=10, duration=duration)
+    new_runs = schedule([(start, end) for start, end, _ in new], fps=10, duration=duration)
+    return changed_ranges(old_runs, [None if run.key is None else old[run.key][2] for run in old_runs],
+                          new_runs, [None if run.key is None else new[run.key][2] for run in new_runs])
+
+
+def test_schedule_fills_gaps_with_blanks() -> None:
+    assert schedule([(0.5, 1.0), (1.0, 2.0)], fps=10) == [Run(0, 5, None), Run(5, 10, 0), Run(10, 20, 1)]
+    assert schedule([(0.5, 1.0)], fps=10, duration=2) == [Run(0, 5, None), Run(5, 10, 0), Run(10, 20, None)]
+
+
+def test_schedule_clips_overlaps_and_drops_empty_intervals() -> None:
+    # the interval too short to cover a frame is dropped, though the blank before it remains
+    assert schedule([(0.0, 1.0), (0.5, 1.5), (2.0, 2.01)], fps=10) == [Run(0, 10, 0), Run(10, 15, 1),
+                                                                       Run(15, 20, None)]
+
+
+def test_changed_ranges_of_identical_schedules_is_empty() -> None:
+    cues = [(0.5, 1.0, "one"), (1.5, 2.0, "two")]
+    assert _changes(cues, list(cues)) == []
+
+
+def test_changed_ranges_text_edit_covers_only_that_segment() -> None:
+    old = [(0.5, 1.0, "one"), (1.5, 2.0, "two"), (2.5, 3.0, "three")]
+    new = [(0.5, 1.0, "one"), (1.5, 2.0, "TWO"), (2.5, 3.0, "three")]
+    assert _changes(old, new) == [(15, 20)]
+
+
+def test_changed_ranges_retime_covers_old_and_new_frames() -> None:
+    old = [(0.5, 1.0, "one"), (2.0, 2.5, "two")]
+    new = [(0.5, 1.0, "one"), (2.2, 2.8, "two")]
+    assert _changes(old, new) == [(20, 22), (25, 28)]
+
+
+def test_changed_ranges_ignores_keys_shifting_when_a_segment_is_inserted() -> None:
+    old = [(0.5, 1.0, "one"), (2.5, 3.0, "three")]
+    new = [(0.5, 1.0, "one"), (1.5, 2.0, "two"), (2.5, 3.0, "three")]
+    assert _changes(old, new) == [(15, 20)]
+
+
+def test_changed_ranges_lengthened_and_shortened_schedules() -> None:
+    short = [(0.5, 1.0, "one")]
+    long = [(0.5, 1.0, "one"), (1.5, 2.0, "two")]
+
+    # frames present in only one of the schedules count as changed
+    assert _changes(short, long) == [(10, 20)]
+    assert _changes(long, short) == [(10, 20)]
+    assert _changes(long, short, duration=3) == [(15, 20)]
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import pytest
+
+from src.jobs import JobCancelled
+from src.utils import work_directory
+
+
+def test_work_directory_is_removed_on_success(tmp_path: Path) -> None:
+    with work_directory(tmp_path) as directory:
+        (directory / "state.png").touch()
+
+    assert not directory.exists()
+
+
+def test_work_directory_is_removed_on_cancel(tmp_path: Path) -> None:
+    with pytest.raises(JobCancelled):
+        with work_directory(tmp_path) as directory:
+            (directory / "state.png").touch()
+            raise JobCancelled
+
+    assert not directory.exists()
+
+
+def test_work_directory_is_kept_on_failure(tmp_path: Path) -> None:
+    with pytest.raises(RuntimeError):
+        with work_directory(tmp_path) as directory:
+            (directory / "state.png").touch()
+            raise RuntimeError
+
+    assert (directory / "state.png").exists()
@@ -0,0 +1,88 @@
+from fractions import Fraction
+from pathlib import Path
+
+import pytest
+
+import src.video
+from src.timeline import schedule, split_at_gaps
+from src.video import BurnInEncoder, Chunk, burn_in, encode_in_chunks, write_concat_script
+
+INTERVALS = [(0.5 + 1.5 * i, 1.5 + 1.5 * i) for i in range(8)]
+
+
+def _frames_arg(command: tuple[str, ...]) -> int | None:
+    return int(command[command.index("-frames:v") + 1]) if "-frames:v" in command else None
+
+
+@pytest.mark.parametrize("fps", [Fraction(10), Fraction(30000, 1001)])
+def test_encode_in_chunks_cuts_each_part_at_its_frame_count(fps: Fraction, tmp_path: Path,
+                                                            monkeypatch: pytest.MonkeyPatch) -> None:
+    commands: list[tuple[str, ...]] = []
+
+    def fake_run_ffmpeg(command, on_progress=None, **kwargs):
+        commands.append(tuple(command))
+        Path(command[-1]).touch()
+
+    monkeypatch.setattr(src.video, "run_ffmpeg", fake_run_ffmpeg)
+
+    sprite = tmp_path / "sprite.png"
+    sprite.touch()
+    runs = schedule(INTERVALS, fps=fps, duration=12)
+    groups = split_at_gaps(runs, 3)
+
+    chunks = [
+        Chunk(write_concat_script([(sprite, run.duration(fps)) for run in group], dest=tmp_path / f"{i}.ffconcat"),
+              frames=sum(run.frames for run in group), part=tmp_path / f"{i}.webm")
+        for i, group in enumerate(groups)
+    ]
+    encode_in_chunks(chunks, fps=fps, dest=tmp_path / "out.webm", workers=2)
+
+    *encodes, join = commands
+    assert sorted(_frames_arg(command) for command in encodes) == sorted(chunk.frames for chunk in chunks)
+    assert sum(_frames_arg(command) for command in encodes) == runs[-1].end
+    assert _frames_arg(join) is None and "copy" in join
+
+
+def test_write_concat_script_durations_do_not_drift(tmp_path: Path) -> None:
+    fps = Fraction(30000, 1001)
+    runs = schedule(INTERVALS, fps=fps, duration=12)
+    sprite = tmp_path / "sprite.png"
+
+    script = write_concat_script([(sprite, run.duration(fps)) for run in runs], dest=tmp_path / "frames.ffconcat")
+    durations = [Fraction(line.split()[1]) for line in script.read_text().splitlines() if line.startswith("duration")]
+
+    assert abs(sum(durations) - runs[-1].end / fps) < Fraction(1, 10**6)
+
+
+def test_write_concat_script_sets_each_image_framerate(tmp_path: Path) -> None:
+    fps = Fraction(30000, 1001)
+    sprite = tmp_path / "sprite.png"
+
+    script = write_concat_script([(sprite, Fraction(1)), (sprite, Fraction(2))], dest=tmp_path / "frames.ffconcat",
+                                 framerate=fps)
+    lines = script.read_text().splitlines()
+
+    # every file line (including the repeated last one) is followed by the framerate option
+    assert all(lines[i + 1] == "option framerate 30000/1001" for i, line in enumerate(lines) if line.startswith("file"))
+
+
+@pytest.mark.parametrize(("encoder", "source", "expected"), [
+    (BurnInEncoder.H264, ".avi", ".avi"),
+    (BurnInEncoder.H264, ".webm", ".mp4"),
+    (BurnInEncoder.H265, ".avi", ".mp4"),
+    (BurnInEncoder.VP9, ".webm", ".webm"),
+    (BurnInEncoder.VP9, ".MP4", ".webm"),
+])
+def test_burn_in_encoder_keeps_compatible_containers(encoder: BurnInEncoder, source: str, expected: str) -> None:
+    assert encoder.suffix(source) == expected
+
+
+def test_burn_in_sets_the_video_encoder(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    commands: list[tuple[str, ...]] = []
+    monkeypatch.setattr(src.video, "run_ffmpeg", lambda command, on_progress=None, **kwargs: commands.append(command))
+
+    burn_in(tmp_path / "in.avi", tmp_path / "frames.ffconcat", offset=(0, 0), dest=tmp_path / "out.avi")
+
+    (command,) = commands
+    assert command[command.index("-c:v") + 1] == "libx264"
+    assert command[-1] == str(tmp_path / "out.avi")